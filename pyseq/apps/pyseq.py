@@ -4,18 +4,30 @@ import argparse
 import pyseq
 from pyseq.apps.pyseq_bin_reads import main
 from pyseq.apps.pyseq_build_db import main
+from pyseq.apps.pyseq_convert_db import main
+from pyseq.apps.pyseq_faidx import main
+from pyseq.apps.pyseq_filter_reads import main
+from pyseq.apps.pyseq_update_db import main
 
 
 SUBCOMMANDS = {
-    "bin_reads" : pyseq.apps.pyseq_bin_reads.main,
-    "build_db"  : pyseq.apps.pyseq_build_db.main
+    "bin_reads"    : pyseq.apps.pyseq_bin_reads.main,
+    "build_db"     : pyseq.apps.pyseq_build_db.main,
+    "convert_db"   : pyseq.apps.pyseq_convert_db.main,
+    "faidx"        : pyseq.apps.pyseq_faidx.main,
+    "filter_reads" : pyseq.apps.pyseq_filter_reads.main,
+    "update_db"    : pyseq.apps.pyseq_update_db.main
 }
 
 USAGE = """Usage: pyseq <subcommand> <subcommand_arguments>
 
 Available subcommands:
 build_db     | Create a minimizer-based kmer reference database and write to file
+update_db    | Add or remove references or bins in an existing kmer reference database
 bin_reads    | Bin reads against a minimizer-based kmer reference database
+filter_reads | Remove reads hitting a kmer reference database and write kept and removed reads to fastq
+convert_db   | Convert a kmer reference database between binary and legacy formats
+faidx        | Index a fasta file and fetch sequences or regions from it
 """
 
 
@@ -1,12 +1,16 @@
 import os
+import sys
 import argparse
+import itertools
+import contextlib
 import json
 
-from pyseq.kmer_utils import KmerDb
-from pyseq.sequence_io import SequenceFile
+from pyseq.kmer_utils import KmerDb, BinSummary, ReadMemo
+from pyseq.formats import Tsv
+from pyseq.sequence_io import SequenceFile, SplitFileWriter
 
 
-USAGE = """pyseq bin_reads [-h] -r REFERENCES -i INPUT -b BINS_JSON [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-a AMBIGUITY_THRESHOLD]
+USAGE = """pyseq bin_reads [-h] -r REFERENCES -i INPUT -b BINS_JSON [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-a AMBIGUITY_THRESHOLD] [-c] [-t THREADS] [-M MAX_MEMORY] [-e EARLY_EXIT] [-u MEMO_SIZE] [-n CHUNK_SIZE] [-o OUTPUT_FILE | -S SUMMARY_TSV] [-s SPLIT_DIR] [-f {fastq,fasta}] [-z] [-F MAX_OPEN_FILES]
 """
 
 
@@ -68,11 +72,86 @@ def parse_args():
         help     = "kmer bin assignment abiguity threshold"
     )
     parser.add_argument(
+        "-c", "--compact",
+        action   = "store_true",
+        help     = "Store database in compact arrays to reduce memory"
+    )
+    parser.add_argument(
+        "-t", "--threads",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of processes used to build the database, parse uncompressed fastq and bin reads"
+    )
+    parser.add_argument(
+        "-M", "--max_memory",
+        type     = int,
+        required = False,
+        default  = None,
+        help     = "maximum MB of database shards loaded at once per process, for sharded databases"
+    )
+    parser.add_argument(
+        "-e", "--early_exit",
+        type     = float,
+        required = False,
+        default  = None,
+        help     = "stop querying a read once its leading bin leads by this fraction of the kmers left, 1 never changes the assigned bin"
+    )
+    parser.add_argument(
+        "-u", "--memo_size",
+        type     = int,
+        required = False,
+        default  = None,
+        help     = "remember results of this many distinct read sequences and reuse them for identical reads"
+    )
+    parser.add_argument(
+        "-n", "--chunk_size",
+        type     = int,
+        required = False,
+        default  = 100000,
+        help     = "number of reads parsed, classified and written at a time"
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
         "-o", "--output_file",
         type     = str,
         required = False,
-        default  = "binned_reads.json",
-        help     = "Output json file with binned reads"
+        default  = None,
+        help     = "Output json file with binned reads, binned_reads.json unless reads are split"
+    )
+    output.add_argument(
+        "-S", "--summary_only",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "Write only per-bin read counts and kmer totals to this tsv instead of per-read json"
+    )
+    parser.add_argument(
+        "-s", "--split_dir",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "Write reads to one file per assigned bin in this directory, unassigned reads to unclassified"
+    )
+    parser.add_argument(
+        "-f", "--split_format",
+        type     = str,
+        required = False,
+        default  = "fastq",
+        choices  = ["fastq", "fasta"],
+        help     = "format of split read files"
+    )
+    parser.add_argument(
+        "-z", "--gzip",
+        action   = "store_true",
+        help     = "gzip split read files"
+    )
+    parser.add_argument(
+        "-F", "--max_open_files",
+        type     = int,
+        required = False,
+        default  = 64,
+        help     = "maximum number of split read files open at once"
     )
     return parser.parse_args()
 
@@ -87,9 +166,70 @@ def load_bin_json(path):
     return bins
 
 
-def write_output_file(info, path):
+def write_output_file(block_results, path):
+    """
+    Write results of each block as one json object, as soon as they are produced.
+    :param block_results: iterable of dicts mapping read names to results
+    :param path: path to output file
+    """
     with open(path, "w") as f:
-        json.dump(info, f)
+        f.write("{")
+        sep = ""
+        for results in block_results:
+            # Identical reads binned with a read memo share one result, encode it once per block
+            encoded = {}
+            for name, result in results.items():
+                text = encoded.get(id(result))
+                if text is None:
+                    text = encoded[id(result)] = json.dumps(result)
+                f.write(f"{sep}{json.dumps(name)}: {text}")
+                sep = ", "
+        f.write("}")
+
+
+def write_summary(summary: BinSummary, path: str):
+    """
+    Write per-bin read counts and kmer totals to a tsv file.
+    :param summary: BinSummary of binned reads
+    :param path: path to output file
+    """
+    tsv = Tsv()
+    tsv.columns = list(BinSummary.COLUMNS)
+    tsv.add_info(summary.to_rows())
+    tsv.write_file(path)
+
+
+def split_reads(blocks, block_results, writer: SplitFileWriter):
+    """
+    Pass block results through, writing the reads of each block to the file
+    of their assigned bin.
+    :param blocks: iterable of ColumnarBlocks in the order of block_results
+    :param block_results: iterable of dicts mapping read names to results
+    :param writer: SplitFileWriter
+    """
+    for block, results in zip(blocks, block_results):
+        bin_reads = {}
+        for i, name in enumerate(block.get_names()):
+            bin = results[name]["assigned_bin"]
+            bin_reads.setdefault(bin, []).append(i)
+        for bin, reads in bin_reads.items():
+            writer.write(bin, block, reads)
+        yield results
+
+
+def count_skipped_kmers(block_results, totals: dict):
+    """
+    Pass block results through, counting reads and kmers skipped by early exit.
+    :param block_results: iterable of dicts mapping read names to results
+    :param totals: dict updated with the numbers of reads, early exited reads and skipped kmers
+    """
+    for results in block_results:
+        for result in results.values():
+            totals["reads"] += 1
+            if result["skipped_kmers"] > 0:
+                totals["early_exit_reads"] += 1
+                totals["skipped_kmers"] += result["skipped_kmers"]
+        yield results
 
 
 def main():
@@ -98,21 +238,53 @@ def main():
     bins = load_bin_json(args.bins_json)
 
     if args.database:
-        kmer_db.load_pyseq_dbi(args.database)
+        max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+        kmer_db.load_pyseq_dbi(args.database, max_memory)
     else:
         db_ref = SequenceFile()
         db_ref.load_sequence_blocks_from_file(args.references)
-        kmer_db.build_kmer_database(db_ref, bins, args.ambiguity_threshold)
-
-    query_seqs = SequenceFile()
-    query_seqs.load_sequence_blocks_from_file(args.input)
-
-    results = {}
-    for block in query_seqs.sequence_blocks:
-        block_results = kmer_db.bin_reads(block)
-        results.update(block_results)
+        kmer_db.build_kmer_database(db_ref, bins, args.ambiguity_threshold, threads = args.threads)
+    if args.compact:
+        kmer_db.compact()
 
-    write_output_file(results, args.output_file)
+    # Parse, classify and write one chunk of reads at a time
+    blocks = SequenceFile().iter_blocks(args.input, args.chunk_size, columnar = True, threads = args.threads)
+    memo = ReadMemo(args.memo_size) if args.memo_size else None
+    if args.summary_only and args.split_dir is None and memo is None:
+        # Per-bin totals are summed in fixed-size counters, no per-read results are kept
+        summary = kmer_db.summarize_blocks(blocks, threads = args.threads, early_exit = args.early_exit)
+        write_summary(summary, args.summary_only)
+        if args.early_exit is not None:
+            print(f"Early exit: {summary.skipped_kmers} kmer lookups skipped", file = sys.stderr)
+        return
+    split_blocks = None
+    if args.split_dir is not None:
+        blocks, split_blocks = itertools.tee(blocks)
+    block_results = kmer_db.bin_blocks(blocks, threads = args.threads, early_exit = args.early_exit, memo = memo)
+    if args.early_exit is not None:
+        totals = {"reads" : 0, "early_exit_reads" : 0, "skipped_kmers" : 0}
+        block_results = count_skipped_kmers(block_results, totals)
+    writer = contextlib.nullcontext()
+    if split_blocks is not None:
+        writer = SplitFileWriter(args.split_dir, args.split_format, args.gzip, args.max_open_files)
+        block_results = split_reads(split_blocks, block_results, writer)
+    with writer:
+        if args.summary_only:
+            summary = BinSummary()
+            for results in block_results:
+                summary.add_results(results)
+            write_summary(summary, args.summary_only)
+        elif args.output_file or split_blocks is None:
+            write_output_file(block_results, args.output_file if args.output_file else "binned_reads.json")
+        else:
+            for _ in block_results:
+                pass
+    if args.early_exit is not None:
+        print(f"Early exit: {totals['early_exit_reads']} of {totals['reads']} reads, "
+              f"{totals['skipped_kmers']} kmer lookups skipped", file = sys.stderr)
+    if memo is not None:
+        print(f"Read memo: {memo.hits} of {memo.lookups} reads reused ({100 * memo.hit_rate():.1f}% hit rate)",
+              file = sys.stderr)
 
 
 if __name__ == '__main__':
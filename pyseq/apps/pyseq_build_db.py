@@ -6,7 +6,7 @@ from pyseq.kmer_utils import KmerDb
 from pyseq.sequence_io import SequenceFile
 
 
-USAGE = """pyseq bin_reads [-h] -r REFERENCES -i INPUT -b BINS_JSON [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-a AMBIGUITY_THRESHOLD]
+USAGE = """pyseq build_db [-h] -r REFERENCES -b BINS_JSON [-o OUTPUT] [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-a AMBIGUITY_THRESHOLD] [-t THREADS] [-s SHARDS] [-p BLOOM_FPR] [-x]
 """
 
 
@@ -62,6 +62,32 @@ def parse_args():
         default  = 2,
         help     = "kmer bin assignment abiguity threshold"
     )
+    parser.add_argument(
+        "-t", "--threads",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of processes used to build the database"
+    )
+    parser.add_argument(
+        "-s", "--shards",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of shards to split the database into by minimizer hash"
+    )
+    parser.add_argument(
+        "-p", "--bloom_fpr",
+        type     = float,
+        required = False,
+        default  = None,
+        help     = "false positive rate of a Bloom filter rejecting absent minimizers, no filter by default"
+    )
+    parser.add_argument(
+        "-x", "--indexed",
+        action   = "store_true",
+        help     = "Read only references listed in the bins file through a .fai index, built if missing"
+    )
     return parser.parse_args()
 
 def load_bin_json(path):
@@ -79,10 +105,13 @@ def main():
     bins = load_bin_json(args.bins_json)
 
     db_ref = SequenceFile()
-    db_ref.load_sequence_blocks_from_file(args.references)
+    if args.indexed:
+        db_ref.load_sequences_from_index(args.references, bins.keys())
+    else:
+        db_ref.load_sequence_blocks_from_file(args.references)
 
-    kmer_db.build_kmer_database(db_ref, bins, args.ambiguity_threshold)
-    kmer_db.write_pyseq_dbi(args.output)
+    kmer_db.build_kmer_database(db_ref, bins, args.ambiguity_threshold, threads = args.threads, bloom_fpr = args.bloom_fpr)
+    kmer_db.write_pyseq_dbi(args.output, shards = args.shards)
 
 if __name__ == '__main__':
     main()
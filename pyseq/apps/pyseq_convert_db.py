@@ -0,0 +1,81 @@
+import os
+import argparse
+
+from pyseq.kmer_utils import KmerDb
+
+
+USAGE = """pyseq convert_db [-h] -d DATABASE -o OUTPUT [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-s SHARDS] [-p BLOOM_FPR] [-l]
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description =
+        f"""Convert a pyseq kmer database between the binary, sharded and legacy formats.""",
+        usage=USAGE,
+        formatter_class=lambda prog: argparse.MetavarTypeHelpFormatter(prog, max_help_position=60)
+    )
+    parser.add_argument(
+        "convert_db",
+        type = str,
+        help = argparse.SUPPRESS
+    )
+    parser.add_argument(
+        "-d", "--database",
+        type     = str,
+        required = True,
+        help     = "Path to pyseq kmer db in either format"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type     = str,
+        required = True,
+        help     = "output database file"
+    )
+    parser.add_argument(
+        "-k", "--kmer_length",
+        type     = int,
+        required = False,
+        default  = 31,
+        help     = "kmer length"
+    )
+    parser.add_argument(
+        "-m", "--minimizer_length",
+        type     = int,
+        required = False,
+        default  = 19,
+        help     = "minimizer length"
+    )
+    parser.add_argument(
+        "-s", "--shards",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of shards to split the database into by minimizer hash"
+    )
+    parser.add_argument(
+        "-p", "--bloom_fpr",
+        type     = float,
+        required = False,
+        default  = None,
+        help     = "false positive rate of a Bloom filter rejecting absent minimizers, no filter by default"
+    )
+    parser.add_argument(
+        "-l", "--legacy",
+        action   = "store_true",
+        help     = "Write zlib-compressed JSON format instead of the binary format"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    kmer_db = KmerDb(args.kmer_length, args.minimizer_length)
+    kmer_db.load_pyseq_dbi(args.database)
+    if args.bloom_fpr is not None:
+        kmer_db.build_bloom_filter(args.bloom_fpr)
+    kmer_db.write_pyseq_dbi(args.output, legacy = args.legacy, shards = args.shards)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+import argparse
+
+from pyseq.sequence_io import FastaIndex
+from pyseq.sequence_io.fasta_index import FastaIndexException
+
+
+USAGE = """pyseq faidx [-h] -r REFERENCES [-o OUTPUT] [-w LINE_WIDTH] [REGION ...]
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description =
+        f"""Index a fasta file (.fai) and write sequences or seq:start-end regions to fasta.""",
+        usage=USAGE,
+        formatter_class=lambda prog: argparse.MetavarTypeHelpFormatter(prog, max_help_position=60)
+    )
+    parser.add_argument(
+        "faidx",
+        type = str,
+        help = argparse.SUPPRESS
+    )
+    parser.add_argument(
+        "regions",
+        type     = str,
+        nargs    = "*",
+        help     = "sequence names or regions (name:start-end, 1-based inclusive) to write"
+    )
+    parser.add_argument(
+        "-r", "--references",
+        type     = str,
+        required = True,
+        help     = "uncompressed fasta file, the index is built if missing"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "output fasta file, defaults to stdout"
+    )
+    parser.add_argument(
+        "-w", "--line_width",
+        type     = int,
+        required = False,
+        default  = 60,
+        help     = "number of bases per output line"
+    )
+    return parser.parse_intermixed_args()
+
+
+def write_regions(index, regions, f, line_width):
+    """
+    Write regions of indexed fasta file to fasta.
+    :param index: FastaIndex
+    :param regions: list of sequence names or regions
+    :param f: text file object
+    :param line_width: number of bases per line
+    """
+    for region in regions:
+        sequence = index.fetch(region)
+        f.write(f">{region}\n")
+        for start in range(0, len(sequence), line_width):
+            f.write(f"{sequence[start : start + line_width]}\n")
+
+
+def main():
+    args = parse_args()
+    try:
+        with FastaIndex(args.references) as index:
+            if args.output is None:
+                write_regions(index, args.regions, sys.stdout, args.line_width)
+            else:
+                with open(args.output, "w") as f:
+                    write_regions(index, args.regions, f, args.line_width)
+    except FastaIndexException as e:
+        raise SystemExit(f"pyseq faidx: {e}")
+
+
+if __name__ == '__main__':
+    main()
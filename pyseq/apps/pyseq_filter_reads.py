@@ -0,0 +1,148 @@
+import os
+import sys
+import argparse
+
+from pyseq.kmer_utils import KmerDb
+from pyseq.kmer_utils.kmer_db import AMBIGUOUS_BIN
+from pyseq.sequence_io import SequenceFile
+
+
+USAGE = """pyseq filter_reads [-h] -d DATABASE -i INPUT -o OUTPUT_FILE [-x REMOVED_FILE] [-H MIN_HITS] [-B BIN [BIN ...]] [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-t THREADS] [-M MAX_MEMORY] [-n CHUNK_SIZE]
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description =
+        f"""Remove reads hitting a kmer reference database, e.g. host or PhiX reads, writing kept and removed reads to fastq.""",
+        usage=USAGE,
+        formatter_class=lambda prog: argparse.MetavarTypeHelpFormatter(prog, max_help_position=60)
+    )
+    parser.add_argument(
+        "filter_reads",
+        type = str,
+        help = argparse.SUPPRESS
+    )
+    parser.add_argument(
+        "-d", "--database",
+        type     = str,
+        required = True,
+        help     = "Path to pyseq kmer db"
+    )
+    parser.add_argument(
+        "-i", "--input",
+        type     = str,
+        required = True,
+        help     = "Input reads fastq/a format"
+    )
+    parser.add_argument(
+        "-o", "--output_file",
+        type     = str,
+        required = True,
+        help     = "Output fastq file with reads not hitting the database"
+    )
+    parser.add_argument(
+        "-x", "--removed_file",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "Output fastq file with reads hitting the database"
+    )
+    parser.add_argument(
+        "-H", "--min_hits",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of kmers matching the database for a read to be removed"
+    )
+    parser.add_argument(
+        "-B", "--bins",
+        type     = str,
+        nargs    = "+",
+        required = False,
+        default  = None,
+        help     = f"only count kmers matching these database bins or {AMBIGUOUS_BIN}"
+    )
+    parser.add_argument(
+        "-k", "--kmer_length",
+        type     = int,
+        required = False,
+        default  = 31,
+        help     = "kmer length"
+    )
+    parser.add_argument(
+        "-m", "--minimizer_length",
+        type     = int,
+        required = False,
+        default  = 19,
+        help     = "minimizer length"
+    )
+    parser.add_argument(
+        "-t", "--threads",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of processes used to parse uncompressed fastq and filter reads"
+    )
+    parser.add_argument(
+        "-M", "--max_memory",
+        type     = int,
+        required = False,
+        default  = None,
+        help     = "maximum MB of database shards loaded at once per process, for sharded databases"
+    )
+    parser.add_argument(
+        "-n", "--chunk_size",
+        type     = int,
+        required = False,
+        default  = 100000,
+        help     = "number of reads parsed, filtered and written at a time"
+    )
+    return parser.parse_args()
+
+
+def write_filtered_reads(filtered_blocks, min_hits: int, kept_file, removed_file = None) -> tuple:
+    """
+    Write reads of each block to the kept or removed fastq file, as soon as
+    the block is filtered.
+    :param filtered_blocks: iterable of (ColumnarBlock, list of database hits of each read)
+    :param min_hits: number of hits for a read to be removed
+    :param kept_file: binary file object for reads with fewer than min_hits hits
+    :param removed_file: binary file object for the other reads, None to discard them
+    :return: (number of kept reads, number of removed reads)
+    """
+    n_kept = n_removed = 0
+    for block, hits in filtered_blocks:
+        kept    = [i for i, n_hits in enumerate(hits) if n_hits < min_hits]
+        removed = [i for i, n_hits in enumerate(hits) if n_hits >= min_hits]
+        block.write_fastq(kept_file, kept)
+        if removed_file is not None:
+            block.write_fastq(removed_file, removed)
+        n_kept    += len(kept)
+        n_removed += len(removed)
+    return n_kept, n_removed
+
+
+def main():
+    args = parse_args()
+    kmer_db = KmerDb(args.kmer_length, args.minimizer_length)
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory is not None else None
+    kmer_db.load_pyseq_dbi(args.database, max_memory)
+    bins = set(args.bins) if args.bins else None
+    known_bins = set(kmer_db.bin_counts) | {AMBIGUOUS_BIN}
+    if bins is not None and kmer_db.bin_counts and not bins <= known_bins:
+        raise SystemExit(f"pyseq filter_reads: bins not in database: {', '.join(sorted(bins - known_bins))}")
+
+    blocks = SequenceFile().iter_blocks(args.input, args.chunk_size, columnar = True, threads = args.threads)
+    filtered_blocks = kmer_db.filter_blocks(blocks, args.threads, args.min_hits, bins)
+    with open(args.output_file, "wb") as kept_file:
+        if args.removed_file is None:
+            n_kept, n_removed = write_filtered_reads(filtered_blocks, args.min_hits, kept_file)
+        else:
+            with open(args.removed_file, "wb") as removed_file:
+                n_kept, n_removed = write_filtered_reads(filtered_blocks, args.min_hits, kept_file, removed_file)
+    print(f"Kept {n_kept} reads, removed {n_removed} reads", file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import os
+import argparse
+
+from pyseq.kmer_utils import KmerDb
+from pyseq.kmer_utils.kmer_db import KmerDbFormatException
+from pyseq.sequence_io import SequenceFile
+from pyseq.apps.pyseq_build_db import load_bin_json
+
+
+USAGE = """pyseq update_db [-h] -d DATABASE -b BINS_JSON [-o OUTPUT] [-r REFERENCES] [-e REMOVE_REFERENCES] [-R BIN [BIN ...]] [-k KMER_LENGTH] [-m MINIMIZER_LENGTH] [-a AMBIGUITY_THRESHOLD] [-t THREADS]
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description =
+        f"""Add or remove references or bins in an existing kmer reference database without rebuilding it.""",
+        usage=USAGE,
+        formatter_class=lambda prog: argparse.MetavarTypeHelpFormatter(prog, max_help_position=60)
+    )
+    parser.add_argument(
+        "update_db",
+        type = str,
+        help = argparse.SUPPRESS
+    )
+    parser.add_argument(
+        "-d", "--database",
+        type     = str,
+        required = True,
+        help     = "Path to binary pyseq kmer db"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "output database file, defaults to updating the database in place"
+    )
+    parser.add_argument(
+        "-b", "--bins_json",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "JSON file mapping added and removed reference sequences to bins"
+    )
+    parser.add_argument(
+        "-r", "--references",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "fasta containing nucleotide reference sequences to add"
+    )
+    parser.add_argument(
+        "-e", "--remove_references",
+        type     = str,
+        required = False,
+        default  = None,
+        help     = "fasta containing nucleotide reference sequences to remove"
+    )
+    parser.add_argument(
+        "-R", "--remove_bins",
+        type     = str,
+        nargs    = "+",
+        required = False,
+        default  = [],
+        help     = "names of bins to remove"
+    )
+    parser.add_argument(
+        "-k", "--kmer_length",
+        type     = int,
+        required = False,
+        default  = 31,
+        help     = "kmer length"
+    )
+    parser.add_argument(
+        "-m", "--minimizer_length",
+        type     = int,
+        required = False,
+        default  = 19,
+        help     = "minimizer length"
+    )
+    parser.add_argument(
+        "-a", "--ambiguity_threshold",
+        type     = int,
+        required = False,
+        default  = None,
+        help     = "new kmer bin assignment abiguity threshold, defaults to that of the database"
+    )
+    parser.add_argument(
+        "-t", "--threads",
+        type     = int,
+        required = False,
+        default  = 1,
+        help     = "number of processes used to kmerize references"
+    )
+    return parser.parse_args()
+
+
+def kmerize_references(kmer_db, path, bins, threads):
+    """
+    Build a database holding the minimizers of reference sequences.
+    :param kmer_db: database the references are added to or removed from
+    :param path: fasta containing reference sequences
+    :param bins: dict to map reference seq names to bins
+    :param threads: number of worker processes
+    """
+    references = KmerDb(kmer_db.kmer_length, kmer_db.minimizer_length, kmer_db.max_ambiguous)
+    ref = SequenceFile()
+    ref.load_sequence_blocks_from_file(path)
+    if threads > 1:
+        references.add_references_parallel(ref.sequence_blocks, bins, threads)
+    else:
+        for block in ref.sequence_blocks:
+            references.add_references(block, bins)
+    return references
+
+
+def main():
+    args = parse_args()
+    kmer_db = KmerDb(args.kmer_length, args.minimizer_length)
+    try:
+        kmer_db.load_pyseq_dbi(args.database)
+    except KmerDbFormatException as e:
+        raise SystemExit(f"pyseq update_db: {e}")
+    if (args.references or args.remove_references) and not args.bins_json:
+        raise SystemExit("pyseq update_db: -b/--bins_json is required to add or remove references")
+    bins = load_bin_json(args.bins_json) if args.bins_json else {}
+
+    added = removed = None
+    if args.references:
+        added = kmerize_references(kmer_db, args.references, bins, args.threads)
+    if args.remove_references:
+        removed = kmerize_references(kmer_db, args.remove_references, bins, args.threads)
+    try:
+        kmer_db.update_database(added, removed, args.remove_bins)
+    except KmerDbFormatException as e:
+        raise SystemExit(f"pyseq update_db: {e}")
+    if args.ambiguity_threshold is not None:
+        kmer_db.finialize_database(args.ambiguity_threshold)
+    kmer_db.write_pyseq_dbi(args.output if args.output else args.database)
+
+
+if __name__ == '__main__':
+    main()
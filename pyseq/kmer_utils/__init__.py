@@ -1,2 +1,3 @@
-from .kmer_db import KmerDb
+from .kmer_db import KmerDb, BinSummary
+from .read_memo import ReadMemo
 from .kmer_utils import *
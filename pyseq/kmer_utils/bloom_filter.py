@@ -0,0 +1,196 @@
+import sys
+import math
+from array import array
+
+from .kmer_batch import np
+
+# Bits per block, a block fills one 64-byte cache line
+BLOOM_BLOCK_BITS  = 512
+BLOOM_BLOCK_WORDS = BLOOM_BLOCK_BITS // 64
+
+# Bit positions in a block are taken 9 bits at a time from 64-bit hashes
+POSITION_BITS      = 9
+POSITIONS_PER_HASH = 64 // POSITION_BITS
+MAX_HASHES         = 16
+
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def mix64(minimizer: int) -> int:
+    """
+    splitmix64 finalizer of an integer minimizer.
+    :param minimizer: integer minimizer
+    """
+    z = (minimizer + 0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
+
+def mix64_array(minimizers):
+    """
+    splitmix64 finalizer of a numpy array of minimizers, equal to mix64.
+    :param minimizers: numpy array of integer minimizers
+    """
+    z = minimizers.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def blocked_false_positive_rate(n: int, n_blocks: int, n_hashes: int) -> float:
+    """
+    Expected false positive rate of a blocked Bloom filter, averaged over
+    the Poisson distributed number of items per block.
+    :param n: number of items
+    :param n_blocks: number of 512-bit blocks
+    :param n_hashes: number of bits set per item
+    """
+    load = n / n_blocks
+    fpr = 0.0
+    p = math.exp(-load)
+    for j in range(int(load + 10 * math.sqrt(load)) + 10):
+        fpr += p * (1 - (1 - 1 / BLOOM_BLOCK_BITS) ** (n_hashes * j)) ** n_hashes
+        p *= load / (j + 1)
+    return fpr
+
+
+class BloomFilter(object):
+    """
+    Blocked Bloom filter of integer minimizers. All bits of a minimizer are
+    set in one 512-bit block chosen by its hash, so a lookup touches a single
+    cache line or page of a memory mapped filter. Absent minimizers are
+    rejected with probability 1 - fpr, present ones are never rejected.
+    :param n_blocks: number of 512-bit blocks
+    :param n_hashes: number of bits set per minimizer
+    :param fpr: target false positive rate the filter was sized for
+    """
+    def __init__(self, n_blocks: int, n_hashes: int, fpr: float = None):
+        super(BloomFilter, self).__init__()
+        self.n_blocks = n_blocks
+        self.n_hashes = n_hashes
+        self.fpr      = fpr
+        self.words    = array("Q", bytes(8 * BLOOM_BLOCK_WORDS * n_blocks))
+
+    @classmethod
+    def build(cls, minimizers, fpr: float = 0.01):
+        """
+        Create filter sized for a false positive rate holding minimizers.
+        :param minimizers: sequence or numpy array of integer minimizers
+        :param fpr: target false positive rate
+        """
+        if not 0 < fpr < 1:
+            raise ValueError(f"Bloom filter false positive rate must be between 0 and 1: {fpr}")
+        n = max(len(minimizers), 1)
+        n_hashes = min(max(1, round(-math.log2(fpr))), MAX_HASHES)
+        # Start from the size of a standard filter and grow it until the
+        # rate of the blocked filter, whose blocks fill unevenly, is reached
+        n_blocks = max(1, math.ceil(n * -math.log(fpr) / math.log(2) ** 2 / BLOOM_BLOCK_BITS))
+        while blocked_false_positive_rate(n, n_blocks, n_hashes) > fpr:
+            n_blocks = math.ceil(n_blocks * 1.02)
+        bloom = cls(n_blocks, n_hashes, fpr)
+        bloom.add(minimizers)
+        return bloom
+
+    @classmethod
+    def from_buffer(cls, buffer: object, start: int, n_blocks: int, n_hashes: int, fpr: float = None):
+        """
+        Create filter viewing little-endian words written by write_words in
+        buffer (e.g. an mmap) without copying them.
+        :param buffer: object supporting the buffer protocol
+        :param start: byte offset of the first word
+        :param n_blocks: number of 512-bit blocks
+        :param n_hashes: number of bits set per minimizer
+        :param fpr: target false positive rate the filter was sized for
+        """
+        bloom = cls(0, n_hashes, fpr)
+        bloom.n_blocks = n_blocks
+        words = memoryview(buffer)[start : start + bloom.nbytes()].cast("Q")
+        if sys.byteorder != "little":
+            words = array("Q", words.tobytes())
+            words.byteswap()
+        bloom.words = words
+        return bloom
+
+    def write_words(self, f):
+        """
+        Write filter words to binary file object in little-endian byte order.
+        :param f: file object opened for binary writing
+        """
+        words = self.words
+        if sys.byteorder != "little":
+            words = array("Q", words)
+            words.byteswap()
+        f.write(words)
+
+    def _positions(self, h: int):
+        """
+        Get word indices and bit masks of a minimizer hash. The block is
+        chosen by the hash, bit positions in the block are read from hashes
+        of the hash.
+        :param h: hash of minimizer
+        """
+        block = h % self.n_blocks * BLOOM_BLOCK_WORDS
+        for i in range(self.n_hashes):
+            if i % POSITIONS_PER_HASH == 0:
+                h = mix64(h)
+            position = (h >> (i % POSITIONS_PER_HASH * POSITION_BITS)) & (BLOOM_BLOCK_BITS - 1)
+            yield block + (position >> 6), 1 << (position & 63)
+
+    def _positions_array(self, h):
+        """
+        Get word indices and bit masks of an array of minimizer hashes for
+        each of the n_hashes bits, equal to _positions.
+        :param h: numpy array of minimizer hashes
+        """
+        block = h % np.uint64(self.n_blocks) * np.uint64(BLOOM_BLOCK_WORDS)
+        mask  = np.uint64(BLOOM_BLOCK_BITS - 1)
+        for i in range(self.n_hashes):
+            if i % POSITIONS_PER_HASH == 0:
+                h = mix64_array(h)
+            position = (h >> np.uint64(i % POSITIONS_PER_HASH * POSITION_BITS)) & mask
+            yield block + (position >> np.uint64(6)), np.uint64(1) << (position & np.uint64(63))
+
+    def add(self, minimizers):
+        """
+        Add minimizers to filter.
+        :param minimizers: sequence or numpy array of integer minimizers
+        """
+        if np is None:
+            words = self.words
+            for minimizer in minimizers:
+                for word, bit in self._positions(mix64(minimizer)):
+                    words[word] |= bit
+            return
+        words = np.frombuffer(self.words, dtype = np.uint64)
+        hashes = mix64_array(np.asarray(minimizers, dtype = np.uint64))
+        for word, bit in self._positions_array(hashes):
+            np.bitwise_or.at(words, word.astype(np.intp), bit)
+
+    def contains(self, minimizers):
+        """
+        Test a numpy array of minimizers.
+        :param minimizers: numpy array of integer minimizers
+        :return: boolean numpy array, False for minimizers not in the filter
+        """
+        words = np.frombuffer(self.words, dtype = np.uint64)
+        found = np.ones(len(minimizers), dtype = bool)
+        for word, bit in self._positions_array(mix64_array(minimizers)):
+            found &= (words[word.astype(np.intp)] & bit) != 0
+        return found
+
+    def nbytes(self) -> int:
+        """
+        Get number of bytes held by the filter.
+        """
+        return 8 * BLOOM_BLOCK_WORDS * self.n_blocks
+
+    def __contains__(self, minimizer: int) -> bool:
+        words = self.words
+        for word, bit in self._positions(mix64(minimizer)):
+            if not words[word] & bit:
+                return False
+        return True
+
+    def __str__(self):
+        return f"BloomFilter(n_blocks={self.n_blocks}, n_hashes={self.n_hashes}, fpr={self.fpr})"
@@ -0,0 +1,184 @@
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .kmer_utils import AMBIGUOUS_CODE, encode_sequence, max_ambiguous_bases
+
+class SequenceBlock: pass
+
+# Number of bases encoded at once, small enough for temporary arrays to stay in cache
+BATCH_BASES = 1 << 16
+
+
+def get_block_minimizers(
+    block            : SequenceBlock,
+    kmer_length      : int,
+    minimizer_length : int,
+    max_ambiguous    : float,
+    batch_bases      : int = BATCH_BASES) -> tuple:
+    """
+    Get minimizers for all reads in a block with vectorized numpy operations.
+    Each read's minimizers are returned in first-occurrence order with kmer
+    counts, matching get_minimized_kmers for that read.
+    :param block: SequenceBlock or ColumnarBlock containing reads
+    :param kmer_length: length of kmers
+    :param minimizer_length: length of minimizers, at most 31
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
+    :param batch_bases: approximate number of bases processed per batch
+    :return: flat arrays (read index, minimizer, kmer count)
+    """
+    if np is None:
+        raise ImportError("numpy is required for batch minimizer extraction")
+    if minimizer_length > 31:
+        raise ValueError("Batch minimizer extraction supports minimizer lengths up to 31")
+    lengths    = block.get_lengths()
+    read_index = [np.zeros(0, dtype=np.int64)]
+    minimizers = [np.zeros(0, dtype=np.uint64)]
+    counts     = [np.zeros(0, dtype=np.int64)]
+    start = 0
+    total = 0
+    for end, length in enumerate(lengths, 1):
+        total += length
+        if total >= batch_bases or end == len(lengths):
+            batch = _get_batch_minimizers(
+                block.get_bases(start, end), lengths[start:end], kmer_length, minimizer_length, max_ambiguous)
+            read_index.append(batch[0] + start)
+            minimizers.append(batch[1])
+            counts.append(batch[2])
+            start = end
+            total = 0
+    return np.concatenate(read_index), np.concatenate(minimizers), np.concatenate(counts)
+
+
+def get_segment_minimizers(
+    block            : SequenceBlock,
+    segments         : list,
+    kmer_length      : int,
+    minimizer_length : int,
+    max_ambiguous    : float,
+    batch_bases      : int = BATCH_BASES) -> tuple:
+    """
+    Get minimizers of read segments, each holding the kmers starting at
+    positions start to end of a read, with vectorized numpy operations.
+    Every kmer belongs to one segment of a read split at kmer positions, so
+    kmer counts summed over the segments equal those of the whole read.
+    :param block: SequenceBlock or ColumnarBlock containing reads
+    :param segments: list of (read index, start, end) kmer positions
+    :param kmer_length: length of kmers
+    :param minimizer_length: length of minimizers, at most 31
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
+    :param batch_bases: approximate number of bases processed per batch
+    :return: flat arrays (segment index, minimizer, kmer count)
+    """
+    if np is None:
+        raise ImportError("numpy is required for batch minimizer extraction")
+    if minimizer_length > 31:
+        raise ValueError("Batch minimizer extraction supports minimizer lengths up to 31")
+    segment_index = [np.zeros(0, dtype=np.int64)]
+    minimizers    = [np.zeros(0, dtype=np.uint64)]
+    counts        = [np.zeros(0, dtype=np.int64)]
+    parts   = []
+    lengths = []
+    first = 0
+    total = 0
+    for j, (i, start, end) in enumerate(segments, 1):
+        part = block.get_bases(i, i + 1)[start : end + kmer_length - 1]
+        parts.append(part)
+        lengths.append(len(part))
+        total += len(part)
+        if total >= batch_bases or j == len(segments):
+            bases = "".join(parts) if isinstance(part, str) else b"".join(parts)
+            batch = _get_batch_minimizers(bases, lengths, kmer_length, minimizer_length, max_ambiguous)
+            segment_index.append(batch[0] + first)
+            minimizers.append(batch[1])
+            counts.append(batch[2])
+            parts   = []
+            lengths = []
+            first = j
+            total = 0
+    return np.concatenate(segment_index), np.concatenate(minimizers), np.concatenate(counts)
+
+
+def _get_batch_minimizers(
+    bases            : str,
+    lengths          : list,
+    kmer_length      : int,
+    minimizer_length : int,
+    max_ambiguous    : float) -> tuple:
+    """
+    Get minimizers for a batch of sequences concatenated into one array.
+    :param bases: concatenated nucleotide sequences, str or bytes-like
+    :param lengths: list of sequence lengths
+    :param kmer_length: length of kmers
+    :param minimizer_length: length of minimizers
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
+    :return: flat arrays (read index, minimizer, kmer count)
+    """
+    lengths = np.array(lengths, dtype=np.int64)
+    ends    = np.cumsum(lengths)
+    n_bases = int(ends[-1]) if len(ends) > 0 else 0
+    if n_bases < kmer_length:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    # Encode bases and count ambiguous bases with a prefix sum
+    codes = np.frombuffer(encode_sequence(bases), dtype=np.uint8)
+    n_ambiguous = np.zeros(n_bases + 1, dtype=np.int64)
+    np.cumsum(codes == AMBIGUOUS_CODE, out=n_ambiguous[1:])
+    bases = (codes & 3).astype(np.uint64)
+    complement = np.uint64(3) - bases
+
+    # Forward and reverse complement codes of the m-mer starting at every base
+    n_mmers = n_bases - minimizer_length + 1
+    fwd = np.zeros(n_mmers, dtype=np.uint64)
+    rev = np.zeros(n_mmers, dtype=np.uint64)
+    two = np.uint64(2)
+    for j in range(minimizer_length):
+        fwd <<= two
+        fwd |= bases[j : j + n_mmers]
+        rev <<= two
+        rev |= complement[minimizer_length - 1 - j : minimizer_length - 1 - j + n_mmers]
+    canonical = np.minimum(fwd, rev)
+    invalid = np.uint64(1 << (2 * minimizer_length))
+    canonical[n_ambiguous[minimizer_length:] != n_ambiguous[:n_mmers]] = invalid
+
+    # Minimum over the m-mers of every kmer
+    n_kmers = n_bases - kmer_length + 1
+    window  = kmer_length - minimizer_length + 1
+    minimum = canonical[:n_kmers].copy()
+    for j in range(1, window):
+        np.minimum(minimum, canonical[j : j + n_kmers], out=minimum)
+
+    # Keep kmers inside a single read with few enough ambiguous bases
+    reads = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)[:n_kmers]
+    positions = np.arange(n_kmers, dtype=np.int64)
+    max_n = max_ambiguous_bases(kmer_length, max_ambiguous)
+    keep = (positions + kmer_length <= ends[reads])
+    keep &= (n_ambiguous[kmer_length:] - n_ambiguous[:n_kmers]) <= max_n
+    keep &= minimum != invalid
+    reads   = reads[keep]
+    minimum = minimum[keep]
+    if len(minimum) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64)
+
+    # Collapse runs of kmers sharing a minimizer before sorting
+    is_first = np.ones(len(minimum), dtype=bool)
+    is_first[1:] = (reads[1:] != reads[:-1]) | (minimum[1:] != minimum[:-1])
+    run_starts  = np.flatnonzero(is_first)
+    run_lengths = np.diff(np.append(run_starts, len(minimum)))
+    reads   = reads[run_starts]
+    minimum = minimum[run_starts]
+
+    # Count kmers per (read, minimizer) and order by first occurrence
+    order = np.lexsort((minimum, reads))
+    sorted_reads   = reads[order]
+    sorted_minimum = minimum[order]
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = (sorted_reads[1:] != sorted_reads[:-1]) | (sorted_minimum[1:] != sorted_minimum[:-1])
+    group_starts = np.flatnonzero(is_first)
+    counts = np.add.reduceat(run_lengths[order], group_starts)
+    first_seen = np.argsort(order[group_starts], kind="stable")
+    group_starts = group_starts[first_seen]
+    return sorted_reads[group_starts], sorted_minimum[group_starts], counts[first_seen]
@@ -2,12 +2,48 @@ import os
 import math
 import json
 import zlib
+import mmap
+import struct
+import tempfile
+import multiprocessing
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
 
-from .kmer_utils import get_minimized_kmers
+from .kmer_utils import get_minimized_kmers, encode_kmer
+from .kmer_batch import np, get_block_minimizers, get_segment_minimizers
+from .kmer_table import KmerTable, minimizer_shard
+from .bloom_filter import BloomFilter
+from .read_memo import ReadMemo
 
 class SequenceFile: pass
 class SequenceBlock: pass
 class KmerDbParameterException(Exception): pass
+class KmerDbFormatException(Exception): pass
+
+# Binary database layout: magic, version (u32), header length (u32), JSON
+# header padded to 8 bytes, then the KmerTable arrays in little-endian order,
+# followed by the BloomFilter words if the header describes a filter.
+# Version 1 databases store minimizers of more than bin_threshold bins folded
+# into the ambiguous bin, version 2 databases store raw per-bin counts.
+PYSEQ_DBI_MAGIC   = b"PYSEQDBI"
+PYSEQ_DBI_VERSION = 2
+PYSEQ_DBI_SUPPORTED_VERSIONS = (1, 2)
+
+# Sharded database manifest: magic followed by a JSON object holding the
+# database header and the shard files, which are binary databases holding
+# the minimizers of one shard each.
+PYSEQ_SHARDS_MAGIC   = b"PYSEQSHD"
+PYSEQ_SHARDS_VERSION = 1
+
+# Bin reported for minimizers found in more than bin_threshold bins
+AMBIGUOUS_BIN = "ambiguous"
+
+# Maximum number of reads classified per worker task
+READS_PER_TASK = 10000
+
+# Number of kmers of a read classified between early exit checks
+EARLY_EXIT_SEGMENT = 1000
 
 
 class BinResult(object):
@@ -25,6 +61,94 @@ class BinResult(object):
         return json.dumps(self.__dict__)
 
 
+class BinSummary(object):
+    """
+    Per-bin totals of binned reads: the number of reads assigned to each bin
+    and the weighted and unweighted kmer counts of each bin summed over all
+    reads. Memory depends on the number of bins, not reads.
+    """
+    UNCLASSIFIED = "unclassified"
+    COLUMNS = ["bin", "reads", "read_fraction", "weighted_kmers", "unweighted_kmers"]
+    def __init__(self):
+        super(BinSummary, self).__init__()
+        self.n_reads       = 0
+        self.skipped_kmers = 0
+        self.reads         = {}
+        self.weighted      = {}
+        self.unweighted    = {}
+
+    def add_read(self, assigned_bin: str, kmer_counts: dict):
+        """
+        Add a binned read.
+        :param assigned_bin: bin assigned to the read, None if unassigned
+        :param kmer_counts: dict containing bin results for the read, bin -> {BinResult}
+        """
+        self._add_read(assigned_bin)
+        for bin_id, bin_result in kmer_counts.items():
+            self._add_kmers(bin_id, bin_result.weighted, bin_result.unweighted)
+
+    def add_results(self, read_results: dict):
+        """
+        Add reads binned by bin_reads.
+        :param read_results: dict mapping read names to results of bin_reads
+        """
+        for result in read_results.values():
+            self._add_read(result["assigned_bin"])
+            self.skipped_kmers += result.get("skipped_kmers", 0)
+            for bin_id, counts in result["kmer_counts"].items():
+                self._add_kmers(bin_id, counts["weighted"], counts["unweighted"])
+
+    def _add_read(self, assigned_bin: str):
+        """
+        Count a read assigned to a bin, or to the unclassified bin if None.
+        """
+        if assigned_bin is None:
+            assigned_bin = self.UNCLASSIFIED
+        self.n_reads += 1
+        self.reads[assigned_bin] = self.reads.get(assigned_bin, 0) + 1
+
+    def _add_kmers(self, bin_id: str, weighted: float, unweighted: int):
+        """
+        Add kmer counts of a read to the totals of a bin.
+        """
+        self.weighted[bin_id]   = self.weighted.get(bin_id, 0) + weighted
+        self.unweighted[bin_id] = self.unweighted.get(bin_id, 0) + unweighted
+
+    def update(self, other):
+        """
+        Add the totals of another summary, e.g. of a worker process.
+        :param other: BinSummary
+        """
+        self.n_reads       += other.n_reads
+        self.skipped_kmers += other.skipped_kmers
+        for bin_id, n_reads in other.reads.items():
+            self.reads[bin_id] = self.reads.get(bin_id, 0) + n_reads
+        for bin_id, weighted in other.weighted.items():
+            self._add_kmers(bin_id, weighted, other.unweighted[bin_id])
+
+    def to_rows(self, digits: int = 3) -> list:
+        """
+        Get one row per bin, ordered by number of assigned reads.
+        :param digits: decimal digits of weighted kmer counts and read fractions
+        :return: list of dicts keyed by COLUMNS
+        """
+        bins = set(self.reads) | set(self.weighted)
+        rows = []
+        for bin_id in sorted(bins, key = lambda bin_id: (-self.reads.get(bin_id, 0), bin_id)):
+            n_reads = self.reads.get(bin_id, 0)
+            rows.append({
+                "bin"              : bin_id,
+                "reads"            : n_reads,
+                "read_fraction"    : round(n_reads / self.n_reads, digits) if self.n_reads > 0 else 0,
+                "weighted_kmers"   : round(self.weighted.get(bin_id, 0), digits),
+                "unweighted_kmers" : self.unweighted.get(bin_id, 0),
+            })
+        return rows
+
+    def __str__(self):
+        return f"BinSummary(n_reads={self.n_reads}, n_bins={len(set(self.reads) | set(self.weighted))})"
+
+
 class KmerDb(object):
     """
     Class to create a kmer database from reference sequences associated with
@@ -41,26 +165,132 @@ class KmerDb(object):
         self.references       = {}
         self.bin_counts       = {}
         self.kmers            = {}
+        self.table            = None
+        self.shards           = None
+        self.bloom            = None
+        self._bin_set_cache   = None
         self.weighted_kmers   = {}
         self.reference_count  = 0
+        self.bin_threshold    = None
+        self.database_path    = None
 
     def build_kmer_database(self,
         reference     : SequenceFile,
         bins          : dict,
-        bin_threshold : int):
+        bin_threshold : int,
+        threads       : int = 1,
+        bloom_fpr     : float = None):
         """
         Create kmer database from reference sequences.
         :param reference: SequenceBlock containing nucleotide references
         :param bins: dict to map reference seq names to bins, name -> {bin_name}
         :param bin_threshold: maximum number of bins a valid kmer can be assigned to
+        :param threads: number of worker processes used to kmerize references
+        :param bloom_fpr: false positive rate of a Bloom filter of the
+            minimizers, no filter is built by default
+        """
+        if threads > 1:
+            self.add_references_parallel(reference.sequence_blocks, bins, threads)
+        else:
+            for block in reference.sequence_blocks:
+                self.add_references(block, bins)
+        self.finialize_database(bin_threshold, bloom_fpr)
+
+    def write_pyseq_dbi(self, output_path: str, legacy: bool = False, shards: int = 1):
+        """
+        Write finished database to a file in the binary format. The file is
+        written next to output_path and moved into place, so a database can
+        be written over the file it is memory mapped from.
+        :param output_path: path to write database file
+        :param legacy: write zlib-compressed JSON format instead
+        :param shards: number of shards to split the database into by
+            minimizer hash, written as output_path.<i>.shard files listed in
+            a manifest written to output_path
+        """
+        if legacy:
+            self.write_legacy_pyseq_dbi(output_path)
+            return
+        if self.table is not None:
+            table = self.table
+        elif self.shards is not None:
+            table = KmerTable.from_items(sorted(self.iter_minimizer_bins(), key = lambda item: item[0]))
+        else:
+            table = KmerTable.from_dict(self.kmers)
+        if shards <= 1:
+            self._write_table(output_path, table, self.bloom)
+            return
+        shard_files = []
+        for i, shard in enumerate(table.partition(shards)):
+            shard_path = f"{output_path}.{i}.shard"
+            # Each shard is filtered by a Bloom filter of its own minimizers
+            bloom = BloomFilter.build(_minimizer_array(shard), self.bloom.fpr) if self.bloom is not None else None
+            self._write_table(shard_path, shard, bloom)
+            shard_files.append({
+                "path"         : os.path.basename(shard_path),
+                "n_minimizers" : len(shard),
+                "size"         : os.path.getsize(shard_path),
+                })
+        manifest = json.dumps({
+            **self._header(),
+            "n_minimizers" : len(table.minimizers),
+            "shards"       : shard_files,
+            }, indent = 1).encode()
+        with open(output_path + ".tmp", "wb") as f:
+            f.write(PYSEQ_SHARDS_MAGIC)
+            f.write(struct.pack("<I", PYSEQ_SHARDS_VERSION))
+            f.write(manifest)
+        os.replace(output_path + ".tmp", output_path)
+
+    def _header(self) -> dict:
+        """
+        Get database parameters and counts stored in file headers.
+        """
+        return {
+            "kmer_length"      : self.kmer_length,
+            "minimizer_length" : self.minimizer_length,
+            "max_ambiguous"    : self.max_ambiguous,
+            "reference_count"  : self.reference_count,
+            "bin_threshold"    : self.bin_threshold,
+            "bin_counts"       : self.bin_counts,
+            }
+
+    def _write_table(self, output_path: str, table: KmerTable, bloom: BloomFilter = None):
+        """
+        Write header, table arrays and Bloom filter to a binary database file.
+        :param output_path: path to write database file
+        :param table: KmerTable holding the minimizers to write
+        :param bloom: BloomFilter of the minimizers of table, or None
         """
-        for block in reference.sequence_blocks:
-            self.add_references(block, bins)
-        self.finialize_database(bin_threshold)
+        if table.set_ids is None:
+            table.intern_bin_sets()
+        header = json.dumps({
+            **self._header(),
+            "bin_names"        : table.bin_names,
+            "n_minimizers"     : len(table.minimizers),
+            "n_entries"        : len(table.bin_ids),
+            "n_bin_sets"       : len(table.set_offsets) - 1,
+            "n_set_entries"    : len(table.set_bin_ids),
+            "bloom"            : None if bloom is None else {
+                "n_blocks" : bloom.n_blocks,
+                "n_hashes" : bloom.n_hashes,
+                "fpr"      : bloom.fpr,
+                },
+            }).encode()
+        header += b" " * (-(len(PYSEQ_DBI_MAGIC) + 8 + len(header)) % 8)
+        with open(output_path + ".tmp", "wb") as f:
+            f.write(PYSEQ_DBI_MAGIC)
+            f.write(struct.pack("<II", PYSEQ_DBI_VERSION, len(header)))
+            f.write(header)
+            table.write_arrays(f)
+            if bloom is not None:
+                bloom.write_words(f)
+        os.replace(output_path + ".tmp", output_path)
 
-    def write_pyseq_dbi(self, output_path:str):
+    def write_legacy_pyseq_dbi(self, output_path: str):
         """
-        Write finished database to a file.
+        Write finished database to a file in the zlib-compressed JSON format.
+        Minimizers of more than bin_threshold bins are folded into the
+        ambiguous bin, as the format has no bin threshold.
         :param output_path: path to write database file
         """
         db_meta = [
@@ -68,20 +298,94 @@ class KmerDb(object):
             self.minimizer_length,
             self.max_ambiguous,
             self.reference_count ]
-        db = f"{json.dumps(db_meta)}metadata"
-        for minimizer, bins in self.kmers.items():
-            info = {
-                "kmer" : minimizer,
-                "bins" : [{"bin_id" : bin_id, "n" : bin_result.unweighted} for bin_id, bin_result in bins.items()]
-            }
-            db += f"{json.dumps(info)}\n"
-        cmp = zlib.compress(db.encode(), 3)
+        cmp = zlib.compressobj(3)
         with open(output_path, "wb") as f:
-            f.write(cmp)
+            f.write(cmp.compress(f"{json.dumps(db_meta)}metadata".encode()))
+            for minimizer, bins in self.iter_minimizer_bins(fold_ambiguous = True):
+                info = {
+                    "kmer" : minimizer,
+                    "bins" : [{"bin_id" : bin_id, "n" : n} for bin_id, n in bins]
+                }
+                f.write(cmp.compress(f"{json.dumps(info)}\n".encode()))
+            f.write(cmp.flush())
+
+    def load_pyseq_dbi(self, database_path: str, max_memory: int = None):
+        """
+        Load existing pyseq database from file. Binary databases are memory
+        mapped and queried in place, legacy databases are decompressed.
+        Shards of sharded databases are mapped when first queried.
+        :param database_path: path to existing database or shard manifest
+        :param max_memory: maximum size in bytes of the shards of a sharded
+            database kept mapped at once, unlimited by default
+        """
+        with open(database_path, "rb") as f:
+            magic = f.read(len(PYSEQ_DBI_MAGIC))
+            if magic == PYSEQ_SHARDS_MAGIC:
+                self.load_sharded_pyseq_dbi(database_path, max_memory)
+                return
+            if magic != PYSEQ_DBI_MAGIC:
+                self.load_legacy_pyseq_dbi(database_path)
+                return
+            version, header_length = struct.unpack("<II", f.read(8))
+            if version not in PYSEQ_DBI_SUPPORTED_VERSIONS:
+                raise KmerDbFormatException(f"Unsupported pyseq database version: {version}")
+            header = json.loads(f.read(header_length))
+            buf = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        self.check_db_meta([header["kmer_length"], header["minimizer_length"], header["max_ambiguous"]])
+        self.reference_count = header["reference_count"]
+        self.bin_threshold = header.get("bin_threshold")
+        self.bin_counts = header.get("bin_counts", {})
+        self.database_path = database_path
+        self.kmers = {}
+        self.shards = None
+        self.table = KmerTable.from_buffer(
+            buf,
+            len(PYSEQ_DBI_MAGIC) + 8 + header_length,
+            header["bin_names"],
+            header["n_minimizers"],
+            header["n_entries"],
+            header.get("n_bin_sets"),
+            header.get("n_set_entries"))
+        self.bloom = None
+        bloom = header.get("bloom")
+        if bloom is not None:
+            self.bloom = BloomFilter.from_buffer(
+                buf,
+                len(PYSEQ_DBI_MAGIC) + 8 + header_length + self.table.nbytes(),
+                bloom["n_blocks"],
+                bloom["n_hashes"],
+                bloom["fpr"])
+
+    def load_sharded_pyseq_dbi(self, database_path: str, max_memory: int = None):
+        """
+        Load manifest of a sharded pyseq database. Shards are loaded lazily.
+        :param database_path: path to shard manifest
+        :param max_memory: maximum size in bytes of the shards kept mapped at once
+        """
+        with open(database_path, "rb") as f:
+            f.read(len(PYSEQ_SHARDS_MAGIC))
+            version, = struct.unpack("<I", f.read(4))
+            if version != PYSEQ_SHARDS_VERSION:
+                raise KmerDbFormatException(f"Unsupported pyseq shard manifest version: {version}")
+            manifest = json.loads(f.read())
+        self.check_db_meta([manifest["kmer_length"], manifest["minimizer_length"], manifest["max_ambiguous"]])
+        self.reference_count = manifest["reference_count"]
+        self.bin_threshold = manifest["bin_threshold"]
+        self.bin_counts = manifest["bin_counts"]
+        self.database_path = database_path
+        self.kmers = {}
+        self.table = None
+        self.bloom = None
+        directory = os.path.dirname(database_path)
+        self.shards = KmerShards(
+            [os.path.join(directory, shard["path"]) for shard in manifest["shards"]],
+            [shard["size"] for shard in manifest["shards"]],
+            (self.kmer_length, self.minimizer_length, self.max_ambiguous),
+            max_memory)
 
-    def load_pyseq_dbi(self, database_path: str):
+    def load_legacy_pyseq_dbi(self, database_path: str):
         """
-        Load existing pyseq database from file.
+        Load existing pyseq database from file in the zlib-compressed JSON format.
         :param database_path: path to existing database
         """
         with open(database_path, "rb") as f:
@@ -90,16 +394,59 @@ class KmerDb(object):
         data = data.split("metadata")
         metadata = json.loads(data[0])
         self.check_db_meta(metadata)
+        self.reference_count = metadata[3]
+        self.bin_threshold = None
+        self.shards = None
+        self.bloom = None
         for line in data[1].split("\n"):
             if len(line) > 2:
                 info = json.loads(line)
                 kmer = info["kmer"]
                 bins = info["bins"]
+                if isinstance(kmer, str):
+                    # Databases written before integer minimizers store strings
+                    try:
+                        kmer = encode_kmer(kmer)
+                    except ValueError:
+                        continue
                 self.kmers.setdefault(kmer, {})
                 for bin in bins:
                     self.kmers[kmer].setdefault(bin["bin_id"], BinResult(bin_name = bin["bin_id"]))
                     self.kmers[kmer][bin["bin_id"]].unweighted = bin["n"]
 
+    def compact(self):
+        """
+        Move finished database into a compact KmerTable. The table is used for
+        queries and the dict based minimizer map is released. Loaded binary
+        and sharded databases are already compact.
+        """
+        if self.shards is not None or self.table is not None:
+            return
+        self.table = KmerTable.from_dict(self.kmers)
+        self.kmers = {}
+
+    def iter_minimizer_bins(self, fold_ambiguous: bool = False):
+        """
+        Iterate over (minimizer, [(bin_id, kmer_count), ...]) in the database.
+        :param fold_ambiguous: move the counts of minimizers in more than
+            bin_threshold bins to the ambiguous bin, zeroing the other bins
+        """
+        if self.table is not None:
+            items = self.table.items()
+        elif self.shards is not None:
+            items = self.shards.items()
+        else:
+            items = ((minimizer, [(bin_id, bin_result.unweighted) for bin_id, bin_result in bins.items()])
+                for minimizer, bins in self.kmers.items())
+        if not fold_ambiguous or self.bin_threshold is None:
+            yield from items
+            return
+        for minimizer, bins in items:
+            if len(bins) > self.bin_threshold:
+                total = sum(kmer_count for _, kmer_count in bins)
+                bins = [(bin_id, 0) for bin_id, _ in bins] + [(AMBIGUOUS_BIN, total)]
+            yield minimizer, bins
+
     def check_db_meta(self, metadata: list):
         """
         Assert that database parameters match those given when object was
@@ -128,6 +475,56 @@ class KmerDb(object):
             if bin_id is not None:
                 self.add_sequence_to_db(bin_id, sequence.sequence)
 
+    def add_references_parallel(self, blocks: list, bins: dict, threads: int):
+        """
+        Add all reference sequences in blocks to database using a process pool.
+        References are split into chunks of similar size, each worker builds a
+        partial table for a chunk and partial tables are merged in reference
+        order, giving the same database as add_references.
+        :param blocks: list of SequenceBlocks containing nucleotide references
+        :param bins: dict to map reference seq names to bins, name -> {bin_name}
+        :param threads: number of worker processes
+        """
+        references = []
+        for block in blocks:
+            for sequence in block.sequences:
+                bin_id = bins.get(sequence.name)
+                if bin_id is not None:
+                    references.append((bin_id, sequence.sequence))
+        # Several chunks per worker to balance uneven reference lengths
+        chunk_bases = sum(len(sequence) for _, sequence in references) // (threads * 4) + 1
+        chunks = [[]]
+        n_bases = 0
+        for bin_id, sequence in references:
+            if n_bases >= chunk_bases:
+                chunks.append([])
+                n_bases = 0
+            chunks[-1].append((bin_id, sequence))
+            n_bases += len(sequence)
+        params = (self.kmer_length, self.minimizer_length, self.max_ambiguous)
+        with ProcessPoolExecutor(max_workers = threads) as executor:
+            for partial in executor.map(_build_partial_table, [params] * len(chunks), chunks):
+                self.merge_partial_table(*partial)
+
+    def merge_partial_table(self, kmers: dict, bin_counts: dict, reference_count: int):
+        """
+        Merge a partial table built from a subset of references into database.
+        :param kmers: map of minimizer -> {bin_name : kmer_count}
+        :param bin_counts: map of bin_name -> kmer_count
+        :param reference_count: number of minimizers added to partial table
+        """
+        for minimizer, bins in kmers.items():
+            entry = self.kmers.setdefault(minimizer, {})
+            for bin_id, kmer_count in bins.items():
+                bin_result = entry.get(bin_id)
+                if bin_result is None:
+                    entry[bin_id] = BinResult(bin_name = bin_id, unweighted = kmer_count)
+                else:
+                    bin_result.unweighted += kmer_count
+        for bin_id, kmer_count in bin_counts.items():
+            self.bin_counts[bin_id] = self.bin_counts.get(bin_id, 0) + kmer_count
+        self.reference_count += reference_count
+
     def add_sequence_to_db(self, bin_id: str, sequence: str):
         """
         Kmerize reference sequence and add to database.
@@ -143,18 +540,102 @@ class KmerDb(object):
             self.kmers[minimizer][bin_id].unweighted += kmer_count
             self.reference_count += 1
 
-    def finialize_database(self, bin_threshold: int):
+    def finialize_database(self, bin_threshold: int, bloom_fpr: float = None):
         """
-        Set kmers occurring in multiple bins to ambiguous bin. [WIP]
+        Set the maximum number of bins a kmer can be assigned to. Minimizers
+        found in more bins are also reported in the ambiguous bin when
+        queried. Raw per-bin counts are kept, so ambiguity is recomputed when
+        the database is updated.
         :param bin_threshold: maximum number of bins a valid kmer can be assigned to
+        :param bloom_fpr: false positive rate of a Bloom filter of the
+            minimizers, an existing filter is kept by default
         """
-        for kmer, bins in self.kmers.items():
-            if len(bins.keys()) > bin_threshold:
-                self.kmers[kmer].setdefault("ambiguous", BinResult(bin_name = "ambiguous"))
-                for bin, count in bins.items():
-                    if bin != "ambiguous":
-                        self.kmers[kmer]["ambiguous"].unweighted += count.unweighted
-                        self.kmers[kmer][bin].unweighted = 0
+        self.bin_threshold = bin_threshold
+        if bloom_fpr is not None:
+            self.build_bloom_filter(bloom_fpr)
+
+    def build_bloom_filter(self, fpr: float = 0.01):
+        """
+        Build a blocked Bloom filter of the minimizers in the database. Blocks
+        of reads are queried with numpy, minimizers rejected by the filter
+        are dropped before the database is probed. The filter is stored in
+        binary database files.
+        :param fpr: false positive rate, the fraction of absent minimizers
+            passing the filter
+        """
+        if self.table is not None:
+            minimizers = _minimizer_array(self.table)
+        elif self.shards is not None:
+            minimizers = [minimizer for minimizer, _ in self.iter_minimizer_bins()]
+        else:
+            minimizers = list(self.kmers.keys())
+        self.bloom = BloomFilter.build(minimizers, fpr)
+
+    def update_database(self,
+        added       = None,
+        removed     = None,
+        remove_bins : list = ()):
+        """
+        Update database in place without rebuilding it. Counts of minimizers
+        of added references are increased and those of removed references
+        decreased, bins whose count drops to zero are removed from the
+        minimizer. Only affected minimizers are rebuilt.
+        :param added: KmerDb built from references to add, or None
+        :param removed: KmerDb built from references to remove, or None
+        :param remove_bins: names of bins to remove entirely
+        """
+        if self.bin_threshold is None:
+            raise KmerDbFormatException("Database does not store raw per-bin counts and must be rebuilt to be updated")
+        if self.shards is not None:
+            raise KmerDbFormatException("Sharded databases cannot be updated, update the unsharded database and shard it again")
+        delta = {}
+        for kmer_db, sign in ((added, 1), (removed, -1)):
+            if kmer_db is None:
+                continue
+            kmer_db.check_db_meta([self.kmer_length, self.minimizer_length, self.max_ambiguous])
+            for minimizer, bins in kmer_db.iter_minimizer_bins():
+                changes = delta.setdefault(minimizer, {})
+                for bin_id, kmer_count in bins:
+                    changes[bin_id] = changes.get(bin_id, 0) + sign * kmer_count
+            for bin_id, kmer_count in kmer_db.bin_counts.items():
+                self.bin_counts[bin_id] = self.bin_counts.get(bin_id, 0) + sign * kmer_count
+            self.reference_count += sign * kmer_db.reference_count
+        remove_bins = set(remove_bins)
+        for bin_id in remove_bins:
+            self.bin_counts.pop(bin_id, None)
+        for bin_id in [bin_id for bin_id, kmer_count in self.bin_counts.items() if kmer_count <= 0]:
+            del self.bin_counts[bin_id]
+        if self.table is not None:
+            self.table = self.table.update(delta, remove_bins)
+            self.database_path = None
+            self._update_bloom_filter()
+            return
+        if len(remove_bins) > 0:
+            for minimizer in list(self.kmers.keys()):
+                bins = self.kmers[minimizer]
+                for bin_id in remove_bins.intersection(bins.keys()):
+                    del bins[bin_id]
+                if len(bins) == 0:
+                    del self.kmers[minimizer]
+        for minimizer, changes in delta.items():
+            bins = self.kmers.setdefault(minimizer, {})
+            for bin_id, change in changes.items():
+                if bin_id in remove_bins:
+                    continue
+                bin_result = bins.setdefault(bin_id, BinResult(bin_name = bin_id))
+                bin_result.unweighted += change
+                if bin_result.unweighted <= 0:
+                    del bins[bin_id]
+            if len(bins) == 0:
+                del self.kmers[minimizer]
+        self._update_bloom_filter()
+
+    def _update_bloom_filter(self):
+        """
+        Rebuild Bloom filter after the minimizers of the database changed.
+        """
+        if self.bloom is not None:
+            self.build_bloom_filter(self.bloom.fpr)
 
     def query_sequence(self, sequence: str) -> dict:
         """
@@ -164,15 +645,292 @@ class KmerDb(object):
         :return results: dict containing bin results, bin -> {BinResult}
         """
         minimized_kmers = get_minimized_kmers(sequence, self.kmer_length, self.minimizer_length, self.max_ambiguous)
-        results = {}
-        for minimizer, kmer_count in minimized_kmers.items():
-            res = self.kmers.get(minimizer, {})
-            for bin_id, counts in res.items():
-                results.setdefault(bin_id, BinResult(bin_name = bin_id))
-                results[bin_id].unweighted += kmer_count
-                results[bin_id].weighted += kmer_count / len(res.keys())
+        return self.query_minimizers(minimized_kmers.keys(), minimized_kmers.values())
+
+    def query_sequence_early_exit(self,
+        sequence       : str,
+        margin         : float = 1.0,
+        segment_length : int = EARLY_EXIT_SEGMENT) -> tuple:
+        """
+        Query sequence kmers segment by segment, stopping once the leading bin
+        leads every other bin by more than margin times the number of kmers
+        left. A kmer adds at most 1 to the weighted count of a bin, so with a
+        margin of 1 the assigned bin is the same as for the whole sequence.
+        Counts are those of the queried kmers.
+        :param sequence: nucloetide sequence string
+        :param margin: fraction of the kmers left the leading bin must lead by
+        :param segment_length: number of kmers queried between checks
+        :return: (dict containing bin results, number of kmers not queried)
+        """
+        n_kmers = max(len(sequence) - self.kmer_length + 1, 0)
+        unweighted = {}
+        weighted   = {}
+        start = 0
+        while start < n_kmers:
+            end = min(start + segment_length, n_kmers)
+            minimized_kmers = get_minimized_kmers(sequence[start : end + self.kmer_length - 1],
+                self.kmer_length, self.minimizer_length, self.max_ambiguous)
+            minimizers = list(minimized_kmers.keys())
+            self._add_bin_sets(unweighted, weighted,
+                map(self._bin_set_lookup(minimizers), minimizers), minimized_kmers.values())
+            start = end
+            if _early_exit_decided(weighted, n_kmers - start, margin):
+                break
+        return self._bin_results(unweighted, weighted), n_kmers - start
+
+    def query_minimizers(self, minimizers, kmer_counts) -> dict:
+        """
+        Query minimizers against database and return weighted and unweighted
+        counts for each bin.
+        :param minimizers: iterable of integer minimizers
+        :param kmer_counts: iterable of kmer counts for each minimizer
+        :return results: dict containing bin results, bin -> {BinResult}
+        """
+        if self.shards is not None:
+            minimizers = list(minimizers)
+        return self._count_bin_sets(map(self._bin_set_lookup(minimizers), minimizers), kmer_counts)
+
+    def _query_bin_set(self, bins) -> tuple:
+        """
+        Get bin set as reported by queries: the bin names, followed by the
+        ambiguous bin if there are more than bin_threshold bins, and the
+        number of reported bins, which divides the weighted kmer counts.
+        :param bins: iterable of bin names
+        """
+        bins = tuple(bins)
+        if self.bin_threshold is not None and len(bins) > self.bin_threshold:
+            bins += (AMBIGUOUS_BIN,)
+        return bins, len(bins)
+
+    def _query_bin_sets(self) -> list:
+        """
+        Get query bin sets of the interned bin sets of the table, indexed by
+        bin set ID. They are computed once per table and bin threshold.
+        """
+        cache = self._bin_set_cache
+        if cache is None or cache[0] is not self.table or cache[1] != self.bin_threshold:
+            bin_sets = [self._query_bin_set(bin_set) for bin_set in self.table.bin_sets()]
+            cache = self._bin_set_cache = (self.table, self.bin_threshold, bin_sets)
+        return cache[2]
+
+    def _bin_set_lookup(self, minimizers):
+        """
+        Get function mapping a minimizer to its query bin set, or None if it
+        is absent. Minimizers of sharded databases are looked up ahead, shard
+        by shard.
+        :param minimizers: sequence of integer minimizers that will be looked up
+        """
+        if self.shards is not None:
+            return self.shards.get_bin_sets(minimizers).get
+        if self.table is not None:
+            bin_sets = self._query_bin_sets()
+            find_set = self.table.find_set
+            def get_bin_set(minimizer):
+                set_id = find_set(minimizer)
+                return bin_sets[set_id] if set_id >= 0 else None
+            return get_bin_set
+        kmers = self.kmers
+        query_bin_set = self._query_bin_set
+        def get_bin_set(minimizer):
+            bins = kmers.get(minimizer)
+            return query_bin_set(bins) if bins is not None else None
+        return get_bin_set
+
+    def _count_bin_sets(self, bin_sets, kmer_counts) -> dict:
+        """
+        Sum weighted and unweighted kmer counts of bins.
+        :param bin_sets: iterable of query bin sets of minimizers, None for absent minimizers
+        :param kmer_counts: iterable of kmer counts for each minimizer
+        """
+        unweighted = {}
+        weighted   = {}
+        self._add_bin_sets(unweighted, weighted, bin_sets, kmer_counts)
+        return self._bin_results(unweighted, weighted)
+
+    @staticmethod
+    def _add_bin_sets(unweighted: dict, weighted: dict, bin_sets, kmer_counts):
+        """
+        Add kmer counts of minimizers to the unweighted and weighted counts of bins.
+        :param unweighted: dict bin -> unweighted kmer count, updated
+        :param weighted: dict bin -> weighted kmer count, updated
+        :param bin_sets: iterable of query bin sets of minimizers, None for absent minimizers
+        :param kmer_counts: iterable of kmer counts for each minimizer
+        """
+        for bin_set, kmer_count in zip(bin_sets, kmer_counts):
+            if bin_set is None:
+                continue
+            bins, n_bins = bin_set
+            for bin_id in bins:
+                unweighted[bin_id] = unweighted.get(bin_id, 0) + kmer_count
+                weighted[bin_id]   = weighted.get(bin_id, 0) + kmer_count / n_bins
+
+    @staticmethod
+    def _bin_results(unweighted: dict, weighted: dict) -> dict:
+        """
+        Get bin results from unweighted and weighted kmer counts of bins.
+        """
+        return {bin_id : BinResult(bin_id, weighted[bin_id], unweighted[bin_id]) for bin_id in unweighted}
+
+    def query_block(self, block: SequenceBlock) -> list:
+        """
+        Query all sequences in block against database. Minimizers are extracted
+        for the whole block at once with numpy when it is installed.
+        :param block: SequenceBlock or ColumnarBlock containing reads to query
+        :return results: list of dicts containing bin results for each read
+        """
+        if np is None or self.minimizer_length > 31:
+            if self.shards is None:
+                return [self.query_sequence(sequence) for sequence in block.get_sequences()]
+            # Look up the minimizers of all reads at once, shard by shard
+            minimized_kmers = [get_minimized_kmers(sequence, self.kmer_length, self.minimizer_length, self.max_ambiguous)
+                for sequence in block.get_sequences()]
+            get_bin_set = self._bin_set_lookup([minimizer for kmers in minimized_kmers for minimizer in kmers.keys()])
+            return [self._count_bin_sets(map(get_bin_set, kmers.keys()), kmers.values()) for kmers in minimized_kmers]
+        read_index, minimizers, kmer_counts = get_block_minimizers(
+            block, self.kmer_length, self.minimizer_length, self.max_ambiguous)
+        read_index, bin_sets, kmer_counts = self._lookup_block_minimizers(read_index, minimizers, kmer_counts)
+        offsets = np.searchsorted(read_index, np.arange(len(block) + 1)).tolist()
+        results = []
+        for i in range(len(block)):
+            start, end = offsets[i], offsets[i + 1]
+            results.append(self._count_bin_sets(bin_sets[start:end], kmer_counts[start:end]))
         return results
 
+    def _lookup_block_minimizers(self, read_index, minimizers, kmer_counts) -> tuple:
+        """
+        Look up the minimizers of a block at once, dropping absent minimizers.
+        :param read_index: numpy array of read indices of minimizers, sorted
+        :param minimizers: numpy array of integer minimizers
+        :param kmer_counts: numpy array of kmer counts for each minimizer
+        :return: (read_index, list of query bin sets, list of kmer counts)
+        """
+        if self.bloom is not None:
+            # Absent minimizers add no counts, drop those rejected by the filter
+            found = self.bloom.contains(minimizers)
+            read_index, minimizers, kmer_counts = read_index[found], minimizers[found], kmer_counts[found]
+        if self.table is not None:
+            # Look up bin set IDs of all minimizers at once
+            query_bin_sets = self._query_bin_sets()
+            set_ids = self.table.find_sets(minimizers)
+            found = set_ids >= 0
+            read_index, set_ids, kmer_counts = read_index[found], set_ids[found], kmer_counts[found]
+            bin_sets = [query_bin_sets[set_id] for set_id in set_ids.tolist()]
+        else:
+            bin_sets = list(map(self._bin_set_lookup(minimizers), minimizers.tolist()))
+            found = np.array([bin_set is not None for bin_set in bin_sets], dtype = bool)
+            read_index, kmer_counts = read_index[found], kmer_counts[found]
+            bin_sets = [bin_set for bin_set in bin_sets if bin_set is not None]
+        return read_index, bin_sets, kmer_counts.tolist()
+
+    def query_block_early_exit(self,
+        block          : SequenceBlock,
+        margin         : float = 1.0,
+        segment_length : int = EARLY_EXIT_SEGMENT) -> tuple:
+        """
+        Query all sequences in block segment by segment as query_sequence_early_exit,
+        extracting the next segment of all undecided reads at once with numpy
+        when it is installed.
+        :param block: SequenceBlock or ColumnarBlock containing reads to query
+        :param margin: fraction of the kmers left the leading bin must lead by
+        :param segment_length: number of kmers queried between checks
+        :return: (list of dicts containing bin results, list of numbers of kmers not queried)
+        """
+        if np is None or self.minimizer_length > 31:
+            results = [self.query_sequence_early_exit(sequence, margin, segment_length)
+                for sequence in block.get_sequences()]
+            return [result[0] for result in results], [result[1] for result in results]
+        n_kmers    = [max(length - self.kmer_length + 1, 0) for length in block.get_lengths()]
+        queried    = [0] * len(block)
+        unweighted = [{} for _ in range(len(block))]
+        weighted   = [{} for _ in range(len(block))]
+        undecided  = [i for i in range(len(block)) if n_kmers[i] > 0]
+        while len(undecided) > 0:
+            segments = [(i, queried[i], min(queried[i] + segment_length, n_kmers[i])) for i in undecided]
+            segment_index, minimizers, kmer_counts = get_segment_minimizers(
+                block, segments, self.kmer_length, self.minimizer_length, self.max_ambiguous)
+            segment_index, bin_sets, kmer_counts = self._lookup_block_minimizers(segment_index, minimizers, kmer_counts)
+            offsets = np.searchsorted(segment_index, np.arange(len(segments) + 1)).tolist()
+            undecided = []
+            for j, (i, _, end) in enumerate(segments):
+                start, stop = offsets[j], offsets[j + 1]
+                self._add_bin_sets(unweighted[i], weighted[i], bin_sets[start:stop], kmer_counts[start:stop])
+                queried[i] = end
+                if not _early_exit_decided(weighted[i], n_kmers[i] - end, margin):
+                    undecided.append(i)
+        results = [self._bin_results(unweighted[i], weighted[i]) for i in range(len(block))]
+        return results, [n_kmers[i] - queried[i] for i in range(len(block))]
+
+    def count_hits(self,
+        sequence       : str,
+        min_hits       : int = None,
+        bins           : set = None,
+        segment_length : int = EARLY_EXIT_SEGMENT) -> int:
+        """
+        Count kmers of sequence whose minimizer is in the database, stopping
+        once min_hits are found. The sequence is queried segment by segment,
+        so no minimizers are extracted after the segment reaching min_hits.
+        :param sequence: nucloetide sequence string
+        :param min_hits: number of hits to stop at, None to count all hits
+        :param bins: only count minimizers found in one of these bins, None for any bin
+        :param segment_length: number of kmers extracted at a time
+        :return: number of hits, at least min_hits if the query stopped early
+        """
+        n_kmers = max(len(sequence) - self.kmer_length + 1, 0)
+        hits  = 0
+        start = 0
+        while start < n_kmers and (min_hits is None or hits < min_hits):
+            end = min(start + segment_length, n_kmers)
+            minimized_kmers = get_minimized_kmers(sequence[start : end + self.kmer_length - 1],
+                self.kmer_length, self.minimizer_length, self.max_ambiguous)
+            get_bin_set = self._bin_set_lookup(list(minimized_kmers.keys()))
+            for minimizer, kmer_count in minimized_kmers.items():
+                bin_set = get_bin_set(minimizer)
+                if bin_set is not None and (bins is None or not bins.isdisjoint(bin_set[0])):
+                    hits += kmer_count
+                    if min_hits is not None and hits >= min_hits:
+                        break
+            start = end
+        return hits
+
+    def filter_block(self,
+        block          : SequenceBlock,
+        min_hits       : int = 1,
+        bins           : set = None,
+        segment_length : int = EARLY_EXIT_SEGMENT) -> list:
+        """
+        Count database hits of all reads in block as count_hits, extracting
+        the next segment of all reads below min_hits at once with numpy when
+        it is installed.
+        :param block: SequenceBlock or ColumnarBlock containing reads to query
+        :param min_hits: number of hits to stop at
+        :param bins: only count minimizers found in one of these bins, None for any bin
+        :param segment_length: number of kmers extracted at a time
+        :return: list of numbers of hits, at least min_hits for reads hitting the database
+        """
+        if np is None or self.minimizer_length > 31:
+            return [self.count_hits(sequence, min_hits, bins, segment_length) for sequence in block.get_sequences()]
+        n_kmers   = [max(length - self.kmer_length + 1, 0) for length in block.get_lengths()]
+        queried   = [0] * len(block)
+        hits      = [0] * len(block)
+        undecided = [i for i in range(len(block)) if n_kmers[i] > 0]
+        while len(undecided) > 0:
+            segments = [(i, queried[i], min(queried[i] + segment_length, n_kmers[i])) for i in undecided]
+            segment_index, minimizers, kmer_counts = get_segment_minimizers(
+                block, segments, self.kmer_length, self.minimizer_length, self.max_ambiguous)
+            segment_index, bin_sets, kmer_counts = self._lookup_block_minimizers(segment_index, minimizers, kmer_counts)
+            if bins is not None:
+                qualifying = np.array([not bins.isdisjoint(bin_set[0]) for bin_set in bin_sets], dtype = bool)
+                segment_index = segment_index[qualifying]
+                kmer_counts   = np.asarray(kmer_counts, dtype = np.int64)[qualifying]
+            segment_hits = np.bincount(segment_index, weights = kmer_counts, minlength = len(segments)).tolist()
+            undecided = []
+            for (i, _, end), n_hits in zip(segments, segment_hits):
+                hits[i]   += int(n_hits)
+                queried[i] = end
+                if hits[i] < min_hits and end < n_kmers[i]:
+                    undecided.append(i)
+        return hits
+
     def assign_sequence_to_bin(self, kmer_counts: dict) -> str:
         """
         Assign read to in using weighted kmer counts.
@@ -187,14 +945,32 @@ class KmerDb(object):
         else:
             return None
 
-    def bin_reads(self, block : SequenceBlock) -> dict:
+    def bin_reads(self, block : SequenceBlock, early_exit: float = None) -> dict:
         """
         Assign reads to database bins.
-        :param block: SequenceBlock containing reads to bin
+        :param block: SequenceBlock or ColumnarBlock containing reads to bin
+        :param early_exit: stop querying a read once its leading bin leads by
+            this fraction of the kmers left, see query_sequence_early_exit.
+            Results then report the number of kmers not queried as skipped_kmers.
         """
         read_results = {}
-        for sequence in block.sequences:
-            kmer_counts = self.query_sequence(sequence.sequence)
+        for name, result in zip(block.get_names(), self._bin_read_results(block, early_exit)):
+            read_results.update({name : result})
+        return read_results
+
+    def _bin_read_results(self, block: SequenceBlock, early_exit: float = None) -> list:
+        """
+        Get bin_reads results of all reads in block in read order.
+        :param block: SequenceBlock or ColumnarBlock containing reads to bin
+        :param early_exit: early exit margin, see bin_reads
+        """
+        if early_exit is None:
+            query_results = self.query_block(block)
+            skipped_kmers = None
+        else:
+            query_results, skipped_kmers = self.query_block_early_exit(block, early_exit)
+        results = []
+        for i, kmer_counts in enumerate(query_results):
             bin = self.assign_sequence_to_bin(kmer_counts)
             result = {
                 "assigned_bin" : bin,
@@ -202,5 +978,390 @@ class KmerDb(object):
             }
             for bin, bin_result in kmer_counts.items():
                 result["kmer_counts"].update({bin : bin_result.to_dict()})
-            read_results.update({sequence.name : result})
-        return read_results
+            if skipped_kmers is not None:
+                result["skipped_kmers"] = skipped_kmers[i]
+            results.append(result)
+        return results
+
+    def bin_blocks(self, blocks, threads: int = 1, early_exit: float = None, memo: ReadMemo = None):
+        """
+        Assign reads in blocks to database bins, yielding results for each
+        block in input order. With more than one thread, blocks are split into
+        tasks classified by worker processes sharing one copy of the database.
+        :param blocks: iterable of SequenceBlocks containing reads to bin
+        :param threads: number of worker processes
+        :param early_exit: early exit margin passed to bin_reads
+        :param memo: ReadMemo of results of previously binned sequences, which
+            are reused for identical reads; results of identical reads are
+            the same dict
+        """
+        if memo is not None:
+            yield from self._bin_blocks_memo(blocks, threads, early_exit, memo)
+            return
+        if threads <= 1:
+            for block in blocks:
+                yield self.bin_reads(block, early_exit)
+            return
+        for _, task_results in self._map_blocks(blocks, threads, _bin_reads_worker, early_exit):
+            block_results = {}
+            for results in task_results:
+                block_results.update(results)
+            yield block_results
+
+    def _bin_blocks_memo(self, blocks, threads: int, early_exit: float, memo: ReadMemo):
+        """
+        Bin reads in blocks as bin_blocks, classifying only one read of each
+        sequence that is not in memo. The memo is kept in this process, so
+        it is shared by all worker processes.
+        :param blocks: iterable of SequenceBlocks containing reads to bin
+        :param threads: number of worker processes
+        :param early_exit: early exit margin passed to bin_reads
+        :param memo: ReadMemo, updated with the results of classified reads
+        """
+        pending = deque()
+        def unique_blocks():
+            for block in blocks:
+                # Each read gets its memoized result or the index of the unique read classified for it
+                reads  = []
+                unique = {}
+                for i, sequence in enumerate(block.get_sequences()):
+                    key = memo.key(sequence)
+                    if key in unique:
+                        # Repeated within the block, classified once
+                        memo.lookups += 1
+                        memo.hits    += 1
+                        reads.append(unique[key][1])
+                        continue
+                    result = memo.get(key)
+                    if result is None:
+                        unique[key] = (i, len(unique))
+                        reads.append(len(unique) - 1)
+                    else:
+                        reads.append(result)
+                pending.append((block, reads, list(unique.keys())))
+                yield block.select([i for i, _ in unique.values()])
+        if threads <= 1:
+            unique_results = (self._bin_read_results(block, early_exit) for block in unique_blocks())
+        else:
+            unique_results = ([result for results in task_results for result in results]
+                for _, task_results in self._map_blocks(unique_blocks(), threads, _bin_read_results_worker, early_exit))
+        for results in unique_results:
+            block, reads, keys = pending.popleft()
+            for key, result in zip(keys, results):
+                memo.put(key, result)
+            block_results = {}
+            for name, read in zip(block.get_names(), reads):
+                block_results.update({name : results[read] if isinstance(read, int) else read})
+            yield block_results
+
+    def summarize_reads(self, block: SequenceBlock, early_exit: float = None) -> BinSummary:
+        """
+        Bin reads and sum per-bin totals without keeping per-read results.
+        :param block: SequenceBlock or ColumnarBlock containing reads to bin
+        :param early_exit: early exit margin, see bin_reads
+        """
+        summary = BinSummary()
+        if early_exit is None:
+            query_results = self.query_block(block)
+        else:
+            query_results, skipped_kmers = self.query_block_early_exit(block, early_exit)
+            summary.skipped_kmers = sum(skipped_kmers)
+        for kmer_counts in query_results:
+            summary.add_read(self.assign_sequence_to_bin(kmer_counts), kmer_counts)
+        return summary
+
+    def summarize_blocks(self, blocks, threads: int = 1, early_exit: float = None) -> BinSummary:
+        """
+        Bin reads in blocks and sum per-bin totals of all reads, so memory
+        does not grow with the number of reads.
+        :param blocks: iterable of SequenceBlocks containing reads to bin
+        :param threads: number of worker processes
+        :param early_exit: early exit margin, see bin_reads
+        """
+        summary = BinSummary()
+        if threads <= 1:
+            for block in blocks:
+                summary.update(self.summarize_reads(block, early_exit))
+            return summary
+        for _, task_results in self._map_blocks(blocks, threads, _summarize_reads_worker, early_exit):
+            for task_summary in task_results:
+                summary.update(task_summary)
+        return summary
+
+    def filter_blocks(self, blocks, threads: int = 1, min_hits: int = 1, bins: set = None):
+        """
+        Count database hits of the reads in blocks as filter_block, yielding
+        each block with the hits of its reads in input order.
+        :param blocks: iterable of SequenceBlocks containing reads to filter
+        :param threads: number of worker processes
+        :param min_hits: number of hits to stop at
+        :param bins: only count minimizers found in one of these bins, None for any bin
+        """
+        if threads <= 1:
+            for block in blocks:
+                yield block, self.filter_block(block, min_hits, bins)
+            return
+        for block, task_results in self._map_blocks(blocks, threads, _filter_reads_worker, min_hits, bins):
+            yield block, [n_hits for hits in task_results for n_hits in hits]
+
+    def _map_blocks(self, blocks, threads: int, worker, *args):
+        """
+        Split blocks into tasks run by worker processes sharing this database,
+        yielding each block with the results of its tasks in input order.
+        :param blocks: iterable of SequenceBlocks
+        :param threads: number of worker processes
+        :param worker: module-level function called with a task block and args
+        :param args: further arguments of worker
+        """
+        with self._worker_pool(threads) as executor:
+            for block in blocks:
+                # Bound the number of tasks in flight so blocks can be streamed
+                pending = deque()
+                task_results = []
+                for task in _split_block(block, READS_PER_TASK):
+                    pending.append(executor.submit(worker, task, *args))
+                    if len(pending) > threads * 2:
+                        task_results.append(pending.popleft().result())
+                while pending:
+                    task_results.append(pending.popleft().result())
+                yield block, task_results
+
+    @contextmanager
+    def _worker_pool(self, threads: int):
+        """
+        Create process pool whose workers share this database. Forked workers
+        inherit it copy-on-write, otherwise workers memory map a binary
+        database file, written to a temporary file if needed.
+        :param threads: number of worker processes
+        """
+        if "fork" in multiprocessing.get_all_start_methods():
+            if self.table is not None:
+                # Forked workers share the query bin sets
+                self._query_bin_sets()
+            with ProcessPoolExecutor(
+                max_workers = threads,
+                mp_context  = multiprocessing.get_context("fork"),
+                initializer = _init_bin_reads_worker,
+                initargs    = (self,)) as executor:
+                yield executor
+            return
+        database_path = self.database_path
+        if database_path is None:
+            with tempfile.NamedTemporaryFile(suffix = ".pyseq.dbi", delete = False) as f:
+                database_path = f.name
+            self.write_pyseq_dbi(database_path)
+        try:
+            params = (self.kmer_length, self.minimizer_length, self.max_ambiguous)
+            max_memory = self.shards.max_memory if self.shards is not None else None
+            with ProcessPoolExecutor(
+                max_workers = threads,
+                initializer = _init_bin_reads_worker,
+                initargs    = ((params, database_path, max_memory),)) as executor:
+                yield executor
+        finally:
+            if database_path != self.database_path:
+                os.remove(database_path)
+
+
+class KmerShards(object):
+    """
+    Shards of a sharded database, memory mapped when first queried. Loaded
+    shards are kept in least recently used order and the least recently used
+    are released once their total file size exceeds max_memory, so databases
+    larger than memory can be queried. Lookups are grouped by shard, starting
+    with shards that are still loaded.
+    :param paths: paths to shard database files, indexed by shard
+    :param sizes: file sizes of shards in bytes
+    :param params: (kmer_length, minimizer_length, max_ambiguous)
+    :param max_memory: maximum total size of loaded shards, unlimited by default
+    """
+    def __init__(self, paths: list, sizes: list, params: tuple, max_memory: int = None):
+        super(KmerShards, self).__init__()
+        self.paths      = paths
+        self.sizes      = sizes
+        self.params     = params
+        self.max_memory = max_memory
+        self.loaded     = OrderedDict()
+        self.n_loads    = 0
+
+    def load_shard(self, shard: int) -> KmerDb:
+        """
+        Get database of a shard, loading it and releasing least recently used
+        shards if needed.
+        :param shard: index of shard
+        """
+        kmer_db = self.loaded.get(shard)
+        if kmer_db is not None:
+            self.loaded.move_to_end(shard)
+            return kmer_db
+        if self.max_memory is not None:
+            while len(self.loaded) > 0 and \
+                    sum(self.sizes[i] for i in self.loaded) + self.sizes[shard] > self.max_memory:
+                # The table views the shard mmap, which is unmapped once released
+                self.loaded.popitem(last = False)
+        kmer_db = KmerDb(*self.params)
+        kmer_db.load_pyseq_dbi(self.paths[shard])
+        self.loaded[shard] = kmer_db
+        self.n_loads += 1
+        return kmer_db
+
+    def get_bin_sets(self, minimizers) -> dict:
+        """
+        Look up minimizers shard by shard.
+        :param minimizers: sequence or numpy array of integer minimizers
+        :return: dict mapping minimizers found in the database to their query bin sets
+        """
+        n_shards = len(self.paths)
+        by_shard = {}
+        if np is not None and isinstance(minimizers, np.ndarray):
+            minimizers = np.unique(minimizers)
+            shards = minimizer_shard(minimizers, n_shards)
+            order = np.argsort(shards, kind = "stable")
+            shards, minimizers = shards[order], minimizers[order]
+            starts = [0] + (np.flatnonzero(shards[1:] != shards[:-1]) + 1).tolist()
+            for start, end in zip(starts, starts[1:] + [len(minimizers)]):
+                if start < end:
+                    by_shard[int(shards[start])] = minimizers[start : end]
+        else:
+            for minimizer in set(minimizers):
+                by_shard.setdefault(minimizer_shard(minimizer, n_shards), []).append(minimizer)
+        found = {}
+        for shard in sorted(by_shard.keys(), key = lambda shard: shard not in self.loaded):
+            kmer_db = self.load_shard(shard)
+            shard_minimizers = by_shard[shard]
+            if np is not None and isinstance(shard_minimizers, np.ndarray):
+                if kmer_db.bloom is not None:
+                    shard_minimizers = shard_minimizers[kmer_db.bloom.contains(shard_minimizers)]
+                query_bin_sets = kmer_db._query_bin_sets()
+                set_ids = kmer_db.table.find_sets(shard_minimizers)
+                hits = set_ids >= 0
+                for minimizer, set_id in zip(shard_minimizers[hits].tolist(), set_ids[hits].tolist()):
+                    found[minimizer] = query_bin_sets[set_id]
+                continue
+            get_bin_set = kmer_db._bin_set_lookup(shard_minimizers)
+            for minimizer in shard_minimizers:
+                bin_set = get_bin_set(minimizer)
+                if bin_set is not None:
+                    found[minimizer] = bin_set
+        return found
+
+    def items(self):
+        """
+        Iterate over (minimizer, [(bin_name, count), ...]) shard by shard.
+        """
+        for shard in range(len(self.paths)):
+            yield from self.load_shard(shard).table.items()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __str__(self):
+        return f"KmerShards(n_shards={len(self.paths)}, n_loaded={len(self.loaded)})"
+
+
+def _minimizer_array(table: KmerTable):
+    """
+    Get minimizers of a table as a numpy array, or the array itself without numpy.
+    :param table: KmerTable
+    """
+    return np.frombuffer(table.minimizers, dtype = np.uint64) if np is not None else table.minimizers
+
+
+def _early_exit_decided(weighted: dict, remaining: int, margin: float) -> bool:
+    """
+    Test whether a read can stop being queried: no kmers are left, or the
+    leading bin leads the runner-up, or zero, by more than margin * remaining.
+    :param weighted: dict bin -> weighted kmer count of the queried kmers
+    :param remaining: number of kmers not queried yet
+    :param margin: fraction of the kmers left the leading bin must lead by
+    """
+    if remaining <= 0:
+        return True
+    first = second = 0
+    for count in weighted.values():
+        if count > first:
+            first, second = count, first
+        elif count > second:
+            second = count
+    return first - second > margin * remaining
+
+
+def _split_block(block: SequenceBlock, max_reads: int) -> list:
+    """
+    Split block into blocks of at most max_reads reads.
+    :param block: SequenceBlock to split
+    :param max_reads: maximum number of reads per block
+    """
+    if len(block) <= max_reads:
+        return [block]
+    return [block.slice(start, start + max_reads) for start in range(0, len(block), max_reads)]
+
+
+# Database used by bin_reads worker processes
+_worker_db = None
+
+def _init_bin_reads_worker(source):
+    """
+    Set database used by a bin_reads worker process.
+    :param source: KmerDb or ((kmer_length, minimizer_length, max_ambiguous), database_path, max_memory)
+    """
+    global _worker_db
+    if isinstance(source, KmerDb):
+        _worker_db = source
+    else:
+        params, database_path, max_memory = source
+        _worker_db = KmerDb(*params)
+        _worker_db.load_pyseq_dbi(database_path, max_memory)
+
+
+def _bin_reads_worker(block: SequenceBlock, early_exit: float = None) -> dict:
+    """
+    Assign reads to database bins in a worker process.
+    :param block: SequenceBlock containing reads to bin
+    :param early_exit: early exit margin passed to bin_reads
+    """
+    return _worker_db.bin_reads(block, early_exit)
+
+
+def _bin_read_results_worker(block: SequenceBlock, early_exit: float = None) -> list:
+    """
+    Get bin_reads results in read order in a worker process.
+    :param block: SequenceBlock containing reads to bin
+    :param early_exit: early exit margin passed to bin_reads
+    """
+    return _worker_db._bin_read_results(block, early_exit)
+
+
+def _summarize_reads_worker(block: SequenceBlock, early_exit: float = None) -> BinSummary:
+    """
+    Sum per-bin totals of binned reads in a worker process.
+    :param block: SequenceBlock containing reads to bin
+    :param early_exit: early exit margin passed to summarize_reads
+    """
+    return _worker_db.summarize_reads(block, early_exit)
+
+
+def _filter_reads_worker(block: SequenceBlock, min_hits: int, bins: set) -> list:
+    """
+    Count database hits of reads in a worker process.
+    :param block: SequenceBlock containing reads to filter
+    :param min_hits: number of hits to stop at
+    :param bins: only count minimizers found in one of these bins, None for any bin
+    """
+    return _worker_db.filter_block(block, min_hits, bins)
+
+
+def _build_partial_table(params: tuple, references: list) -> tuple:
+    """
+    Build a partial minimizer table in a worker process.
+    :param params: (kmer_length, minimizer_length, max_ambiguous)
+    :param references: list of (bin_name, sequence)
+    :return: (minimizer -> {bin_name : kmer_count}, bin_counts, reference_count)
+    """
+    kmer_db = KmerDb(*params)
+    for bin_id, sequence in references:
+        kmer_db.add_sequence_to_db(bin_id, sequence)
+    kmers = {}
+    for minimizer, bins in kmer_db.kmers.items():
+        kmers[minimizer] = {bin_id: bin_result.unweighted for bin_id, bin_result in bins.items()}
+    return kmers, kmer_db.bin_counts, kmer_db.reference_count
@@ -0,0 +1,401 @@
+import os
+import sys
+from array import array
+from bisect import bisect_left
+
+from .kmer_batch import np
+from .bloom_filter import mix64_array
+
+# Multiplier of the Fibonacci hash spreading minimizers evenly over shards
+SHARD_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def minimizer_shard(minimizer, n_shards: int):
+    """
+    Get shard of an integer minimizer, or of each minimizer in a numpy array.
+    :param minimizer: integer minimizer or numpy array of minimizers
+    :param n_shards: number of shards
+    """
+    if np is not None and isinstance(minimizer, np.ndarray):
+        hashed = minimizer.astype(np.uint64) * np.uint64(SHARD_HASH_MULTIPLIER)
+        return (hashed >> np.uint64(32)) % np.uint64(n_shards)
+    return (((minimizer * SHARD_HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> 32) % n_shards
+
+
+class KmerTable(object):
+    """
+    Compact, read-only minimizer table stored in typed arrays. Minimizers are
+    kept as sorted integers and the bins of minimizer i are
+    bin_ids[offsets[i]:offsets[i + 1]] with kmer counts in the parallel counts
+    array. Bin names are interned to integer IDs. Lookups use binary search.
+
+    For a synthetic reference of 8 bins of 200 kb genomes with 2% divergence
+    (97k minimizers, 284k minimizer/bin entries, k=31, m=19) the table uses
+    3.9 MB compared to 55.8 MB for the dict of dicts of BinResult used while
+    building, measured with tracemalloc.
+
+    Queries only need the bins of a minimizer, so distinct bin ID sequences
+    are also interned into bin sets: minimizer i is in bin set set_ids[i],
+    whose bins are set_bin_ids[set_offsets[s]:set_offsets[s + 1]]. The
+    minimizers of the reference above fall into 255 bin sets.
+    :param bin_names: list of bin names, indexed by bin ID
+    """
+    # Array attributes and typecodes in on-disk order
+    ARRAYS = (
+        ("minimizers", "Q"),
+        ("offsets",    "Q"),
+        ("bin_ids",    "I"),
+        ("counts",     "I"),
+    )
+    # Bin set array attributes and typecodes in on-disk order
+    SET_ARRAYS = (
+        ("set_offsets", "Q"),
+        ("set_ids",     "I"),
+        ("set_bin_ids", "I"),
+    )
+    def __init__(self, bin_names: list = None):
+        super(KmerTable, self).__init__()
+        self.bin_names  = bin_names if bin_names is not None else []
+        self.minimizers = array("Q")
+        self.offsets    = array("Q", [0])
+        self.bin_ids    = array("I")
+        self.counts     = array("I")
+        self.set_offsets = None
+        self.set_ids     = None
+        self.set_bin_ids = None
+
+    @classmethod
+    def from_dict(cls, kmers: dict):
+        """
+        Create table from map of minimizer -> {bin_name : BinResult}.
+        :param kmers: minimizer map as built by KmerDb
+        """
+        return cls.from_items(
+            (minimizer, [(bin_name, bin_result.unweighted) for bin_name, bin_result in kmers[minimizer].items()])
+            for minimizer in sorted(kmers.keys()))
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Create table from (minimizer, [(bin_name, count), ...]) in minimizer order.
+        :param items: iterable of minimizers and their bins, e.g. KmerTable.items()
+        """
+        table = cls()
+        bin_index = {}
+        for minimizer, bins in items:
+            for bin_name, kmer_count in bins:
+                bin_id = bin_index.get(bin_name)
+                if bin_id is None:
+                    bin_id = bin_index[bin_name] = len(table.bin_names)
+                    table.bin_names.append(bin_name)
+                table.bin_ids.append(bin_id)
+                table.counts.append(kmer_count)
+            table.minimizers.append(minimizer)
+            table.offsets.append(len(table.bin_ids))
+        return table
+
+    @classmethod
+    def from_buffer(cls,
+        buffer       : object,
+        start        : int,
+        bin_names    : list,
+        n_minimizers : int,
+        n_entries    : int,
+        n_bin_sets   : int = None,
+        n_set_entries: int = None):
+        """
+        Create table viewing little-endian arrays written by write_arrays in
+        buffer (e.g. an mmap) without copying them.
+        :param buffer: object supporting the buffer protocol
+        :param start: byte offset of the first array
+        :param bin_names: list of bin names, indexed by bin ID
+        :param n_minimizers: number of minimizers in table
+        :param n_entries: number of minimizer/bin entries in table
+        :param n_bin_sets: number of bin sets, None if none were written
+        :param n_set_entries: number of bin set/bin entries
+        """
+        table = cls(bin_names)
+        lengths = {
+            "minimizers"  : n_minimizers,
+            "offsets"     : n_minimizers + 1,
+            "bin_ids"     : n_entries,
+            "counts"      : n_entries,
+            "set_offsets" : (n_bin_sets or 0) + 1,
+            "set_ids"     : n_minimizers,
+            "set_bin_ids" : n_set_entries,
+        }
+        arrays = cls.ARRAYS + (cls.SET_ARRAYS if n_bin_sets is not None else ())
+        view = memoryview(buffer)
+        for name, typecode in arrays:
+            size = array(typecode).itemsize * lengths[name]
+            values = view[start : start + size].cast(typecode)
+            if sys.byteorder != "little":
+                values = array(typecode, values.tobytes())
+                values.byteswap()
+            setattr(table, name, values)
+            start += size
+        return table
+
+    def write_arrays(self, f):
+        """
+        Write table arrays and bin sets, if interned, to binary file object
+        in little-endian byte order, padded to a multiple of 8 bytes.
+        :param f: file object opened for binary writing
+        """
+        arrays = KmerTable.ARRAYS + (KmerTable.SET_ARRAYS if self.set_ids is not None else ())
+        n_bytes = 0
+        for name, typecode in arrays:
+            values = getattr(self, name)
+            if sys.byteorder != "little":
+                values = array(typecode, values)
+                values.byteswap()
+            f.write(values)
+            n_bytes += len(values) * array(typecode).itemsize
+        f.write(bytes(-n_bytes % 8))
+
+    def intern_bin_sets(self):
+        """
+        Intern the distinct bin ID sequences of minimizers into bin sets.
+        Bins keep their order, so queries report them in the same order.
+        """
+        n = len(self.minimizers)
+        if np is not None and n > 0:
+            offsets = np.frombuffer(self.offsets, dtype = np.uint64).astype(np.int64)
+            lengths = np.diff(offsets)
+            bin_ids = np.frombuffer(self.bin_ids, dtype = np.uint32)
+            positions = np.arange(len(bin_ids)) - np.repeat(offsets[:-1], lengths)
+            if lengths.min() > 0:
+                # Hash bin ID sequences, group equal hashes and check for collisions
+                entry_hashes = mix64_array((bin_ids.astype(np.uint64) << np.uint64(32)) | positions.astype(np.uint64))
+                hashes = np.add.reduceat(entry_hashes, offsets[:-1]) ^ mix64_array(lengths.astype(np.uint64))
+                _, first, inverse = np.unique(hashes, return_index = True, return_inverse = True)
+                representative = first[inverse]
+                same = (lengths == lengths[representative]).all() and \
+                    (bin_ids == bin_ids[np.repeat(offsets[representative], lengths) + positions]).all()
+                if same:
+                    # Number bin sets in order of first occurrence
+                    order = np.argsort(first)
+                    rank  = np.empty(len(order), dtype = np.int64)
+                    rank[order] = np.arange(len(order))
+                    rows = first[order]
+                    set_lengths = lengths[rows]
+                    set_starts  = np.repeat(offsets[rows], set_lengths)
+                    set_offsets = np.concatenate(([0], np.cumsum(set_lengths)))
+                    set_entries = set_starts + np.arange(set_offsets[-1]) - np.repeat(set_offsets[:-1], set_lengths)
+                    self.set_offsets = array("Q", set_offsets.astype(np.uint64).tobytes())
+                    self.set_ids     = array("I", rank[inverse].astype(np.uint32).tobytes())
+                    self.set_bin_ids = array("I", bin_ids[set_entries].tobytes())
+                    return
+        set_index = {}
+        self.set_offsets = array("Q", [0])
+        self.set_ids     = array("I")
+        self.set_bin_ids = array("I")
+        for i in range(n):
+            bin_set = tuple(self.bin_ids[self.offsets[i] : self.offsets[i + 1]])
+            set_id = set_index.get(bin_set)
+            if set_id is None:
+                set_id = set_index[bin_set] = len(set_index)
+                self.set_bin_ids.extend(bin_set)
+                self.set_offsets.append(len(self.set_bin_ids))
+            self.set_ids.append(set_id)
+
+    def bin_sets(self) -> list:
+        """
+        Get bin names of each bin set, indexed by bin set ID.
+        """
+        if self.set_ids is None:
+            self.intern_bin_sets()
+        bin_names, set_bin_ids, set_offsets = self.bin_names, self.set_bin_ids, self.set_offsets
+        return [tuple(bin_names[bin_id] for bin_id in set_bin_ids[set_offsets[s] : set_offsets[s + 1]])
+            for s in range(len(set_offsets) - 1)]
+
+    def find_set(self, minimizer: int) -> int:
+        """
+        Get bin set ID of minimizer or -1 if absent.
+        :param minimizer: integer minimizer
+        """
+        if self.set_ids is None:
+            self.intern_bin_sets()
+        i = self.find(minimizer)
+        return self.set_ids[i] if i >= 0 else -1
+
+    def find_sets(self, minimizers):
+        """
+        Get bin set IDs of a numpy array of minimizers.
+        :param minimizers: numpy array of integer minimizers
+        :return: numpy int64 array, -1 for absent minimizers
+        """
+        if self.set_ids is None:
+            self.intern_bin_sets()
+        set_ids = np.full(len(minimizers), -1, dtype = np.int64)
+        if len(self.minimizers) == 0:
+            return set_ids
+        table_minimizers = np.frombuffer(self.minimizers, dtype = np.uint64)
+        positions = np.minimum(np.searchsorted(table_minimizers, minimizers), len(table_minimizers) - 1)
+        found = table_minimizers[positions] == minimizers
+        set_ids[found] = np.frombuffer(self.set_ids, dtype = np.uint32)[positions[found]]
+        return set_ids
+
+    def update(self, delta: dict, remove_bins = ()):
+        """
+        Get a new table with bin counts changed by delta and bins removed.
+        Entries whose count drops to zero are removed, as are minimizers left
+        without bins. Only minimizers in delta are rebuilt in Python, other
+        entries are copied with vectorized numpy operations when numpy is
+        installed.
+        :param delta: map of minimizer -> {bin_name : change in kmer count}
+        :param remove_bins: collection of bin names to remove
+        """
+        remove_bins = set(remove_bins)
+        bin_names = [bin_name for bin_name in self.bin_names if bin_name not in remove_bins]
+        bin_index = {bin_name : bin_id for bin_id, bin_name in enumerate(bin_names)}
+        for changes in delta.values():
+            for bin_name in changes.keys():
+                if bin_name not in bin_index and bin_name not in remove_bins:
+                    bin_index[bin_name] = len(bin_names)
+                    bin_names.append(bin_name)
+        new_ids = [bin_index.get(bin_name, -1) for bin_name in self.bin_names]
+
+        # Rebuild entries of minimizers in delta
+        changed = {}
+        for minimizer in sorted(delta.keys()):
+            counts = {}
+            i = self.find(minimizer)
+            if i >= 0:
+                for j in range(self.offsets[i], self.offsets[i + 1]):
+                    if new_ids[self.bin_ids[j]] >= 0:
+                        counts[new_ids[self.bin_ids[j]]] = self.counts[j]
+            for bin_name, change in delta[minimizer].items():
+                if bin_name not in remove_bins:
+                    bin_id = bin_index[bin_name]
+                    counts[bin_id] = counts.get(bin_id, 0) + change
+            changed[minimizer] = [(bin_id, kmer_count) for bin_id, kmer_count in counts.items() if kmer_count > 0]
+
+        table = KmerTable(bin_names)
+        if np is None:
+            # Merge unchanged and changed minimizers in sorted order
+            entries = []
+            for minimizer, bins in self.items():
+                if minimizer not in changed:
+                    bins = [(bin_index[bin_name], kmer_count) for bin_name, kmer_count in bins if bin_name not in remove_bins]
+                    entries.append((minimizer, bins))
+            entries.extend(changed.items())
+            entries.sort(key = lambda entry: entry[0])
+            for minimizer, bins in entries:
+                if len(bins) > 0:
+                    table.minimizers.append(minimizer)
+                    for bin_id, kmer_count in bins:
+                        table.bin_ids.append(bin_id)
+                        table.counts.append(kmer_count)
+                    table.offsets.append(len(table.bin_ids))
+            return table
+
+        minimizers = np.frombuffer(self.minimizers, dtype = np.uint64)
+        lengths    = np.diff(np.frombuffer(self.offsets, dtype = np.uint64).astype(np.int64))
+        entry_minimizers = np.repeat(minimizers, lengths)
+        bin_ids = np.array(new_ids, dtype = np.int64)[np.frombuffer(self.bin_ids, dtype = np.uint32)]
+        counts  = np.frombuffer(self.counts, dtype = np.uint32)
+        # Drop entries of removed bins and of changed minimizers
+        keep = bin_ids >= 0
+        changed_minimizers = np.fromiter(changed.keys(), dtype = np.uint64, count = len(changed))
+        positions = np.searchsorted(minimizers, changed_minimizers)
+        found = positions < len(minimizers)
+        found[found] = minimizers[positions[found]] == changed_minimizers[found]
+        is_changed = np.zeros(len(minimizers), dtype = bool)
+        is_changed[positions[found]] = True
+        keep &= ~np.repeat(is_changed, lengths)
+        # Insert rebuilt entries, which are in minimizer order, among the kept ones
+        new_entries = [(minimizer, bin_id, kmer_count) for minimizer, bins in changed.items() for bin_id, kmer_count in bins]
+        new_minimizers = np.array([entry[0] for entry in new_entries], dtype = np.uint64)
+        entry_minimizers = entry_minimizers[keep]
+        insert_at = np.searchsorted(entry_minimizers, new_minimizers)
+        entry_minimizers = np.insert(entry_minimizers, insert_at, new_minimizers)
+        bin_ids = np.insert(bin_ids[keep], insert_at, [entry[1] for entry in new_entries])
+        counts  = np.insert(counts[keep].astype(np.int64), insert_at, [entry[2] for entry in new_entries])
+        starts = np.flatnonzero(np.concatenate(([True], entry_minimizers[1:] != entry_minimizers[:-1]))) \
+            if len(entry_minimizers) > 0 else np.zeros(0, dtype = np.int64)
+        table.minimizers = array("Q", entry_minimizers[starts].astype(np.uint64).tobytes())
+        table.offsets    = array("Q", np.append(starts, len(entry_minimizers)).astype(np.uint64).tobytes())
+        table.bin_ids    = array("I", bin_ids.astype(np.uint32).tobytes())
+        table.counts     = array("I", counts.astype(np.uint32).tobytes())
+        return table
+
+    def partition(self, n_shards: int) -> list:
+        """
+        Split table by minimizer hash into n_shards tables sharing bin IDs.
+        :param n_shards: number of shards
+        :return: list of tables, table i holds the minimizers of shard i
+        """
+        tables = [KmerTable(list(self.bin_names)) for _ in range(n_shards)]
+        if np is None:
+            for i, minimizer in enumerate(self.minimizers):
+                table = tables[minimizer_shard(minimizer, n_shards)]
+                start, end = self.offsets[i], self.offsets[i + 1]
+                table.minimizers.append(minimizer)
+                table.bin_ids.extend(self.bin_ids[start : end])
+                table.counts.extend(self.counts[start : end])
+                table.offsets.append(len(table.bin_ids))
+            return tables
+
+        minimizers = np.frombuffer(self.minimizers, dtype = np.uint64)
+        offsets    = np.frombuffer(self.offsets, dtype = np.uint64).astype(np.int64)
+        bin_ids    = np.frombuffer(self.bin_ids, dtype = np.uint32)
+        counts     = np.frombuffer(self.counts, dtype = np.uint32)
+        shards     = minimizer_shard(minimizers, n_shards)
+        entry_shards = np.repeat(shards, np.diff(offsets))
+        for shard, table in enumerate(tables):
+            selected = shards == shard
+            entries  = entry_shards == shard
+            lengths  = np.diff(offsets)[selected]
+            table.minimizers = array("Q", minimizers[selected].tobytes())
+            table.offsets    = array("Q", np.concatenate(([0], np.cumsum(lengths))).astype(np.uint64).tobytes())
+            table.bin_ids    = array("I", bin_ids[entries].tobytes())
+            table.counts     = array("I", counts[entries].tobytes())
+        return tables
+
+    def find(self, minimizer: int) -> int:
+        """
+        Get index of minimizer in table or -1 if absent.
+        :param minimizer: integer minimizer
+        """
+        i = bisect_left(self.minimizers, minimizer)
+        if i < len(self.minimizers) and self.minimizers[i] == minimizer:
+            return i
+        return -1
+
+    def get_bins(self, minimizer: int, default = None) -> list:
+        """
+        Get names of bins containing minimizer.
+        :param minimizer: integer minimizer
+        :param default: value returned if minimizer is absent
+        """
+        i = self.find(minimizer)
+        if i < 0:
+            return default
+        bin_names = self.bin_names
+        return [bin_names[bin_id] for bin_id in self.bin_ids[self.offsets[i] : self.offsets[i + 1]]]
+
+    def items(self):
+        """
+        Iterate over (minimizer, [(bin_name, count), ...]) in minimizer order.
+        """
+        for i, minimizer in enumerate(self.minimizers):
+            start, end = self.offsets[i], self.offsets[i + 1]
+            yield minimizer, [(self.bin_names[self.bin_ids[j]], self.counts[j]) for j in range(start, end)]
+
+    def nbytes(self) -> int:
+        """
+        Get number of bytes held by the table and bin set arrays, padded to
+        a multiple of 8 bytes as written by write_arrays.
+        """
+        arrays = [self.minimizers, self.offsets, self.bin_ids, self.counts]
+        if self.set_ids is not None:
+            arrays += [self.set_offsets, self.set_ids, self.set_bin_ids]
+        n_bytes = sum(a.itemsize * len(a) for a in arrays)
+        return n_bytes + -n_bytes % 8
+
+    def __len__(self):
+        return len(self.minimizers)
+
+    def __str__(self):
+        return f"KmerTable(n_minimizers={len(self.minimizers)}, n_bins={len(self.bin_names)})"
@@ -1,6 +1,7 @@
 import os
 import sys
 import math
+from collections import deque
 
 
 
@@ -18,6 +19,23 @@ NT_ALPHABET = {
     "n" : "n",
 }
 
+# 2-bit nucleotide encoding. Lexicographic order of ACGT strings matches the
+# integer order of their encodings, so integer minimizers select the same
+# m-mers as string comparison.
+NT_ENCODING = {
+    "A" : 0,
+    "C" : 1,
+    "G" : 2,
+    "T" : 3,
+    "a" : 0,
+    "c" : 1,
+    "g" : 2,
+    "t" : 3,
+}
+NT_DECODING    = "ACGT"
+AMBIGUOUS_CODE = 4
+_ENCODING_TABLE = bytes(NT_ENCODING.get(chr(i), AMBIGUOUS_CODE) for i in range(256))
+
 
 def reverse_complement(sequence: str) -> str:
     """
@@ -64,6 +82,131 @@ def get_kmer_minimizer(kmer: str, rev_kmer: str, minimizer_length) -> str:
     return min
 
 
+def encode_kmer(kmer: str) -> int:
+    """
+    Encode kmer as 2-bit packed integer.
+    :param kmer: nucleotide sequence containing only A, C, G or T
+    """
+    code = 0
+    for base in kmer:
+        value = NT_ENCODING.get(base)
+        if value is None:
+            raise ValueError(f"Cannot encode ambiguous base '{base}' in kmer {kmer}")
+        code = (code << 2) | value
+    return code
+
+
+def decode_kmer(code: int, kmer_length: int) -> str:
+    """
+    Decode 2-bit packed integer to nucleotide string.
+    :param code: encoded kmer
+    :param kmer_length: length of kmer
+    """
+    bases = []
+    for i in range(kmer_length - 1, -1, -1):
+        bases.append(NT_DECODING[(code >> (2 * i)) & 3])
+    return "".join(bases)
+
+
+def encode_sequence(sequence: str) -> bytes:
+    """
+    Encode sequence as one 2-bit code (0-3) per base, ambiguous bases are
+    encoded as AMBIGUOUS_CODE.
+    :param sequence: nucleotide sequence string or ASCII bytes-like object
+    """
+    if not isinstance(sequence, str):
+        return bytes(sequence).translate(_ENCODING_TABLE)
+    return sequence.encode("ascii", "replace").translate(_ENCODING_TABLE)
+
+
+def max_ambiguous_bases(kmer_length: int, max_ambiguous: float) -> int:
+    """
+    Get the largest number of ambiguous bases a kmer can contain while passing
+    apply_ambiguous_threshold.
+    :param kmer_length: length of kmers
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
+    """
+    n = 0
+    while n < kmer_length and (n + 1) / kmer_length <= max_ambiguous:
+        n += 1
+    return n
+
+
+def iter_kmer_minimizers(
+    sequence         : str,
+    kmer_length      : int,
+    minimizer_length : int,
+    max_ambiguous    : float):
+    """
+    Yield (minimizer, kmer count) for each run of consecutive valid kmers
+    sharing an integer minimizer, in sequence order. Forward and reverse
+    complement m-mer codes are rolled one base at a time and the minimizer of
+    a kmer is the smallest canonical m-mer it contains. Window minima are kept
+    in a monotone deque so each base costs amortized O(1) regardless of
+    kmer_length - minimizer_length. m-mers containing ambiguous bases are never
+    selected and kmers without a valid m-mer are skipped.
+    :param sequence: nucleotide sequence string
+    :param kmer_length: length of kmers
+    :param minimizer_length: length of minimizers
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
+    """
+    mask     = (1 << (2 * minimizer_length)) - 1
+    invalid  = mask + 1
+    rc_codes = [(3 - code) << (2 * (minimizer_length - 1)) for code in range(4)]
+    window   = kmer_length - minimizer_length + 1
+    max_n    = max_ambiguous_bases(kmer_length, max_ambiguous)
+    codes    = encode_sequence(sequence)
+
+    fwd = 0
+    rev = 0
+    pending = minimizer_length - 1
+    ambiguous_until = 0
+    # Candidate m-mers in window, increasing in both value and position
+    values    = deque()
+    positions = deque()
+    run_minimizer = invalid
+    run_length = 0
+    for i, code in enumerate(codes):
+        # Roll forward and reverse complement m-mer codes
+        if code != AMBIGUOUS_CODE:
+            fwd = ((fwd << 2) | code) & mask
+            rev = (rev >> 2) | rc_codes[code]
+            if pending:
+                pending -= 1
+                value = invalid
+            else:
+                value = fwd if fwd < rev else rev
+        else:
+            pending = minimizer_length - 1
+            ambiguous_until = i + kmer_length
+            value = invalid
+
+        # Drop candidates that can no longer be a window minimum
+        while values and values[-1] >= value:
+            values.pop()
+            positions.pop()
+        values.append(value)
+        positions.append(i)
+        if positions[0] <= i - window:
+            values.popleft()
+            positions.popleft()
+
+        minimum = values[0]
+        if i < kmer_length - 1 or minimum == invalid:
+            continue
+        if i < ambiguous_until and codes.count(AMBIGUOUS_CODE, i - kmer_length + 1, i + 1) > max_n:
+            continue
+        if minimum == run_minimizer:
+            run_length += 1
+        else:
+            if run_length:
+                yield run_minimizer, run_length
+            run_minimizer = minimum
+            run_length = 1
+    if run_length:
+        yield run_minimizer, run_length
+
+
 def get_minimized_kmers(
     sequence         : str,
     kmer_length      : int,
@@ -71,28 +214,15 @@ def get_minimized_kmers(
     max_ambiguous    : float
     ) -> dict:
     """
-    Get a map of minimizers to kmer counts from sequence.
+    Get a map of integer minimizers to kmer counts from sequence.
     :param sequence: nucleotide sequence string
     :param kmer_length: length of kmers
     :param minimizer_length: length of minimizers
+    :param max_ambiguous: maximum fraction of ambiguous bases in a kmer
     """
-    seq_length = len(sequence)
-    sequence_rc = reverse_complement(sequence)
-    i = 0
     minimized = {}
-    while i < (seq_length - kmer_length + 1):
-        kmer      = sequence[i : (i + kmer_length)]
-        if apply_ambiguous_threshold(kmer, max_ambiguous) == False:
-            i += 1
-            continue
-        rev_kmer  = sequence_rc[(seq_length - kmer_length - i) : (seq_length - i)]
-        if apply_ambiguous_threshold(rev_kmer, max_ambiguous) == False:
-            i += 1
-            continue
-        minimizer = get_kmer_minimizer(kmer, rev_kmer, minimizer_length)
-        minimized.setdefault(minimizer, 0)
-        minimized[minimizer] += 1
-        i += 1
+    for minimizer, kmer_count in iter_kmer_minimizers(sequence, kmer_length, minimizer_length, max_ambiguous):
+        minimized[minimizer] = minimized.get(minimizer, 0) + kmer_count
     return minimized
 
 
@@ -0,0 +1,67 @@
+import hashlib
+from collections import OrderedDict
+
+
+class ReadMemo(object):
+    """
+    Bounded least recently used memo of read classification results, keyed
+    by a 128-bit hash of the read sequence, so identical reads, e.g. of
+    amplicon libraries, are classified once. Lookups and hits are counted.
+    :param max_reads: maximum number of sequences remembered
+    """
+    def __init__(self, max_reads: int = 1000000):
+        super(ReadMemo, self).__init__()
+        self.max_reads = max_reads
+        self.results   = OrderedDict()
+        self.lookups   = 0
+        self.hits      = 0
+
+    @staticmethod
+    def key(sequence) -> bytes:
+        """
+        Get memo key of a read sequence.
+        :param sequence: nucleotide sequence string or bytes-like object
+        """
+        if isinstance(sequence, str):
+            sequence = sequence.encode()
+        return hashlib.blake2b(sequence, digest_size = 16).digest()
+
+    def get(self, key: bytes):
+        """
+        Get remembered result of a key and mark it as recently used.
+        :param key: memo key of a read sequence
+        :return: result, or None if the sequence is not remembered
+        """
+        self.lookups += 1
+        result = self.results.get(key)
+        if result is not None:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def put(self, key: bytes, result):
+        """
+        Remember result of a key, forgetting the least recently used key if
+        max_reads keys are remembered.
+        :param key: memo key of a read sequence
+        :param result: classification result, not None
+        """
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.max_reads:
+            self.results.popitem(last = False)
+
+    def hit_rate(self) -> float:
+        """
+        Get fraction of lookups answered from the memo.
+        """
+        return self.hits / self.lookups if self.lookups > 0 else 0.0
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def __str__(self):
+        return f"ReadMemo(max_reads={self.max_reads}, n_reads={len(self.results)}, hit_rate={self.hit_rate():.3f})"
@@ -1,2 +1,5 @@
 from .sequence_block import SequenceRead, SequenceBlock
 from .sequence_file import SequenceFile
+from .columnar_block import ColumnarBlock
+from .fasta_index import FastaIndex
+from .split_writer import SplitFileWriter
@@ -0,0 +1,178 @@
+import os
+from array import array
+
+from .sequence_block import SequenceRead
+
+
+class ColumnarBlock(object):
+    """
+    Block of reads stored column-wise. The bases of all reads are kept in one
+    contiguous buffer, qualities in a second and names in a third, with offset
+    arrays marking where each read starts. Reads are accessed as memoryview
+    slices without copying, and a block pickles as a few buffers, so it is
+    cheap to send to worker processes. Comments are not stored and reads
+    without quality scores (fasta) get default quality scores when requested.
+    """
+    def __init__(self):
+        super(ColumnarBlock, self).__init__()
+        self.bases           = bytearray()
+        self.qualities       = bytearray()
+        self.names           = bytearray()
+        self.base_offsets    = array("Q", [0])
+        self.quality_offsets = array("Q", [0])
+        self.name_offsets    = array("Q", [0])
+
+    @classmethod
+    def from_reads(cls, reads):
+        """
+        Create block from SequenceReads.
+        :param reads: iterable of SequenceReads, e.g. SequenceBlock.sequences
+        """
+        block = cls()
+        for read in reads:
+            block.add_read(read.name, read.sequence, read.quality_scores)
+        return block
+
+    def add_read(self, name: str, sequence: str, quality_scores: str = None):
+        """
+        Append read to block. Non-ASCII bases are stored as "?".
+        :param name: name of read
+        :param sequence: nucleotide sequence string
+        :param quality_scores: fastq quality score string, None for default qualities
+        """
+        self.names += name.encode()
+        self.name_offsets.append(len(self.names))
+        self.bases += sequence.encode("ascii", "replace")
+        self.base_offsets.append(len(self.bases))
+        if quality_scores is not None and len(quality_scores) == len(sequence):
+            self.qualities += quality_scores.encode("ascii", "replace")
+        self.quality_offsets.append(len(self.qualities))
+
+    def get_name(self, i: int) -> str:
+        """
+        Get name of read i.
+        :param i: index of read
+        """
+        return self.names[self.name_offsets[i] : self.name_offsets[i + 1]].decode()
+
+    def get_sequence(self, i: int) -> memoryview:
+        """
+        Get bases of read i without copying.
+        :param i: index of read
+        """
+        return memoryview(self.bases)[self.base_offsets[i] : self.base_offsets[i + 1]]
+
+    def get_quality(self, i: int):
+        """
+        Get quality scores of read i without copying, or default quality
+        scores if the read has none.
+        :param i: index of read
+        """
+        start, end = self.quality_offsets[i], self.quality_offsets[i + 1]
+        if start == end:
+            return SequenceRead.DEFAULT_QUALITY.encode() * (self.base_offsets[i + 1] - self.base_offsets[i])
+        return memoryview(self.qualities)[start : end]
+
+    def get_read(self, i: int) -> SequenceRead:
+        """
+        Get read i as a SequenceRead.
+        :param i: index of read
+        """
+        read = SequenceRead()
+        read.name           = self.get_name(i)
+        read.sequence       = self.get_sequence(i).tobytes().decode()
+        read.quality_scores = bytes(self.get_quality(i)).decode()
+        return read
+
+    def get_names(self) -> list:
+        """
+        Get names of all reads.
+        """
+        return [self.get_name(i) for i in range(len(self))]
+
+    def get_sequences(self) -> list:
+        """
+        Get sequence strings of all reads.
+        """
+        return [self.get_sequence(i).tobytes().decode() for i in range(len(self))]
+
+    def get_lengths(self) -> list:
+        """
+        Get sequence lengths of all reads.
+        """
+        offsets = self.base_offsets
+        return [offsets[i + 1] - offsets[i] for i in range(len(self))]
+
+    def get_bases(self, start: int, end: int) -> memoryview:
+        """
+        Get concatenated bases of reads start to end without copying.
+        :param start: index of first read
+        :param end: index after last read
+        """
+        return memoryview(self.bases)[self.base_offsets[start] : self.base_offsets[end]]
+
+    def write_fastq(self, f, reads = None):
+        """
+        Write reads to a binary file object in fastq format with one write,
+        reads without quality scores get default quality scores.
+        :param f: file object opened for binary writing
+        :param reads: indices of reads to write, defaults to all reads
+        """
+        if reads is None:
+            reads = range(len(self))
+        names, name_offsets = self.names, self.name_offsets
+        chunks = []
+        for i in reads:
+            chunks += (b"@", names[name_offsets[i] : name_offsets[i + 1]], b"\n",
+                self.get_sequence(i), b"\n+\n", self.get_quality(i), b"\n")
+        f.write(b"".join(chunks))
+
+    def write_fasta(self, f, reads = None):
+        """
+        Write reads to a binary file object in fasta format with one write,
+        each sequence on a single line.
+        :param f: file object opened for binary writing
+        :param reads: indices of reads to write, defaults to all reads
+        """
+        if reads is None:
+            reads = range(len(self))
+        names, name_offsets = self.names, self.name_offsets
+        chunks = []
+        for i in reads:
+            chunks += (b">", names[name_offsets[i] : name_offsets[i + 1]], b"\n", self.get_sequence(i), b"\n")
+        f.write(b"".join(chunks))
+
+    def slice(self, start: int, end: int):
+        """
+        Get block holding a copy of reads start to end.
+        :param start: index of first read
+        :param end: index after last read
+        """
+        end = min(end, len(self))
+        block = ColumnarBlock()
+        for data, offsets in (("bases", "base_offsets"), ("qualities", "quality_offsets"), ("names", "name_offsets")):
+            values = getattr(self, offsets)
+            first  = values[start]
+            setattr(block, data, getattr(self, data)[first : values[end]])
+            setattr(block, offsets, array("Q", (offset - first for offset in values[start : end + 1])))
+        return block
+
+    def select(self, reads: list):
+        """
+        Get block holding a copy of the given reads.
+        :param reads: indices of reads
+        """
+        block = ColumnarBlock()
+        for data, offsets in (("bases", "base_offsets"), ("qualities", "quality_offsets"), ("names", "name_offsets")):
+            values, selected, selected_offsets = getattr(self, offsets), getattr(block, data), getattr(block, offsets)
+            source = memoryview(getattr(self, data))
+            for i in reads:
+                selected += source[values[i] : values[i + 1]]
+                selected_offsets.append(len(selected))
+        return block
+
+    def __len__(self):
+        return len(self.base_offsets) - 1
+
+    def __str__(self):
+        return f"ColumnarBlock(n_seqs={len(self)})"
@@ -0,0 +1,208 @@
+import os
+import bz2
+import gzip
+import lzma
+import queue
+import shutil
+import threading
+import subprocess
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class DecompressionException(Exception): pass
+
+# Magic bytes at the start of compressed files
+COMPRESSION_MAGIC = {
+    "gzip"  : b"\x1f\x8b",
+    "bzip2" : b"BZh",
+    "xz"    : b"\xfd7zXZ\x00",
+    "zstd"  : b"\x28\xb5\x2f\xfd",
+}
+
+# Command line decompressors writing to stdout, in order of preference
+DECOMPRESSION_COMMANDS = {
+    "gzip"  : [["pigz", "-dc"], ["gzip", "-dc"]],
+    "bzip2" : [["pbzip2", "-dc"], ["bzip2", "-dc"]],
+    "xz"    : [["xz", "-dc", "-T0"]],
+    "zstd"  : [["zstd", "-dc"]],
+}
+
+# Size and number of decompressed chunks queued by the background thread
+BACKGROUND_CHUNK_SIZE = 1 << 22
+BACKGROUND_QUEUE_SIZE = 4
+
+
+def detect_compression(f) -> str:
+    """
+    Detect compression format from magic bytes of a binary file object
+    positioned at its start, the position is restored.
+    :param f: seekable binary file object
+    :return: name of compression format or None if uncompressed
+    """
+    magic = f.read(6)
+    f.seek(0)
+    for compression, compression_magic in COMPRESSION_MAGIC.items():
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+
+def find_decompression_command(compression: str) -> list:
+    """
+    Get the first installed command line decompressor for a format.
+    :param compression: name of compression format
+    :return: command as list of arguments, or None if none is installed
+    """
+    for command in DECOMPRESSION_COMMANDS.get(compression, []):
+        if shutil.which(command[0]) is not None:
+            return command
+    return None
+
+
+class DecompressedFile(object):
+    """
+    Binary file object returning the decompressed contents of a gzip, bzip2,
+    xz, zstd or uncompressed file. The format is detected from the magic bytes
+    of the opened file. Multi-member gzip files such as block gzip (BGZF) are
+    read to the end. Decompression can run in an external process (pigz,
+    zstd, ...) and/or a background thread filling a bounded queue, so it
+    overlaps with parsing. zstd files need the zstandard module or the zstd
+    command.
+    :param path: path to file
+    :param use_subprocess: decompress with an installed command line tool if available
+    :param background: decompress in a background thread, by default if the
+        file is compressed and more than one CPU is available
+    """
+    def __init__(self,
+        path           : str,
+        use_subprocess : bool = False,
+        background     : bool = None):
+        super(DecompressedFile, self).__init__()
+        self.path        = path
+        self.process     = None
+        self.raw         = open(path, "rb")
+        self.compression = detect_compression(self.raw)
+        command = None
+        if self.compression is not None and (use_subprocess or
+                (self.compression == "zstd" and zstandard is None)):
+            command = find_decompression_command(self.compression)
+        if self.compression is None:
+            self.stream = self.raw
+        elif command is not None:
+            self.raw.close()
+            self.process = subprocess.Popen(command + [path], stdout = subprocess.PIPE)
+            self.stream  = self.process.stdout
+        elif self.compression == "gzip":
+            self.stream = gzip.GzipFile(fileobj = self.raw)
+        elif self.compression == "bzip2":
+            self.stream = bz2.BZ2File(self.raw)
+        elif self.compression == "xz":
+            self.stream = lzma.LZMAFile(self.raw)
+        elif zstandard is not None:
+            self.stream = zstandard.ZstdDecompressor().stream_reader(self.raw, read_across_frames = True)
+        else:
+            self.raw.close()
+            raise DecompressionException(f"Reading zstd file {path} requires the zstandard module or the zstd command")
+        if background is None:
+            background = self.compression is not None and (os.cpu_count() or 1) > 1
+        self.reader = _BackgroundReader(self.stream) if background else self.stream
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read up to size decompressed bytes, or everything if size is negative.
+        :param size: number of bytes
+        """
+        return self.reader.read(size)
+
+    def close(self):
+        """
+        Stop background decompression and close file.
+        """
+        if self.reader is not self.stream:
+            self.reader.close()
+        self.stream.close()
+        self.raw.close()
+        if self.process is not None:
+            # A process stopped early by the closed pipe exits with a signal
+            returncode = self.process.wait()
+            if returncode > 0:
+                raise DecompressionException(f"Decompressing {self.path} failed with exit code {returncode}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _BackgroundReader(object):
+    """
+    Read a stream in a background thread into a bounded queue of chunks.
+    :param stream: binary file object
+    """
+    def __init__(self, stream):
+        super(_BackgroundReader, self).__init__()
+        self.stream  = stream
+        self.queue   = queue.Queue(maxsize = BACKGROUND_QUEUE_SIZE)
+        self.stop    = threading.Event()
+        self.buffer  = b""
+        self.at_end  = False
+        self.thread  = threading.Thread(target = self._fill, daemon = True)
+        self.thread.start()
+
+    def _fill(self):
+        """
+        Put chunks of the stream on the queue, followed by b"" at the end of
+        the stream or the exception raised while reading.
+        """
+        while not self.stop.is_set():
+            try:
+                chunk = self.stream.read(BACKGROUND_CHUNK_SIZE)
+            except Exception as e:
+                chunk = e
+            while not self.stop.is_set():
+                try:
+                    self.queue.put(chunk, timeout = 0.1)
+                    break
+                except queue.Full:
+                    pass
+            if not isinstance(chunk, bytes) or len(chunk) == 0:
+                return
+
+    def _next_chunk(self) -> bytes:
+        """
+        Get next chunk from queue, re-raising errors of the background thread.
+        """
+        chunk = self.queue.get()
+        if isinstance(chunk, Exception) or len(chunk) == 0:
+            self.at_end = True
+        if isinstance(chunk, Exception):
+            raise chunk
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read up to size bytes, or everything if size is negative.
+        :param size: number of bytes
+        """
+        chunks = [self.buffer]
+        n_bytes = len(self.buffer)
+        while (size < 0 or n_bytes < size) and not self.at_end:
+            chunk = self._next_chunk()
+            chunks.append(chunk)
+            n_bytes += len(chunk)
+        data = b"".join(chunks)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+    def close(self):
+        """
+        Stop background thread.
+        """
+        self.stop.set()
+        self.thread.join()
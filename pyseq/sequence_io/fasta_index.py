@@ -0,0 +1,190 @@
+import os
+import mmap
+
+from .decompression import detect_compression
+
+class FastaIndexException(Exception): pass
+
+
+class FastaIndexRecord(object):
+    """
+    Entry of a samtools-compatible fasta index (.fai).
+    :param name: sequence name, the header up to the first whitespace
+    :param length: number of bases
+    :param offset: byte offset of the first base
+    :param line_bases: number of bases per line
+    :param line_width: number of bytes per line including the line ending
+    """
+    def __init__(self, name: str, length: int, offset: int, line_bases: int, line_width: int):
+        super(FastaIndexRecord, self).__init__()
+        self.name       = name
+        self.length     = length
+        self.offset     = offset
+        self.line_bases = line_bases
+        self.line_width = line_width
+
+    def __str__(self):
+        return f"{self.name}\t{self.length}\t{self.offset}\t{self.line_bases}\t{self.line_width}"
+
+
+class FastaIndex(object):
+    """
+    Random access to the sequences of an uncompressed fasta file through a
+    samtools-compatible .fai index. The fasta file is memory mapped, so only
+    the requested bases are read. A missing or outdated index is built and
+    written next to the fasta file.
+    :param fasta_path: path to uncompressed fasta file
+    :param index_path: path to .fai index, defaults to fasta_path + ".fai"
+    """
+    def __init__(self, fasta_path: str, index_path: str = None):
+        super(FastaIndex, self).__init__()
+        self.fasta_path = fasta_path
+        self.index_path = index_path if index_path is not None else fasta_path + ".fai"
+        self.records    = {}
+        self.file       = open(fasta_path, "rb")
+        if detect_compression(self.file) is not None:
+            self.file.close()
+            raise FastaIndexException(f"Indexed fasta file {fasta_path} must be uncompressed")
+        if os.path.getsize(fasta_path) > 0:
+            self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        else:
+            self.data = b""
+        if os.path.exists(self.index_path) and \
+                os.path.getmtime(self.index_path) >= os.path.getmtime(fasta_path):
+            self.read_index(self.index_path)
+        else:
+            self.build_index()
+            self.write_index(self.index_path)
+
+    def build_index(self):
+        """
+        Index all sequences of the fasta file. Lines of a sequence must have
+        equal length, only the last line may be shorter.
+        """
+        self.records = {}
+        data = self.data
+        n = len(data)
+        start = 0 if data[:1] == b">" else data.find(b"\n>") + 1
+        while start < n and data[start : start + 1] == b">":
+            header_end = data.find(b"\n", start)
+            if header_end < 0:
+                header_end = n
+            next_start = data.find(b"\n>", header_end)
+            next_start = n if next_start < 0 else next_start + 1
+            header = data[start + 1 : header_end].split()
+            name = header[0].decode() if len(header) > 0 else ""
+            if name not in self.records:
+                self.records[name] = self._index_sequence(name, header_end + 1, data[header_end + 1 : next_start])
+            start = next_start
+
+    @staticmethod
+    def _index_sequence(name: str, offset: int, sequence: bytes) -> FastaIndexRecord:
+        """
+        Index one sequence, checking line lengths with strided slices.
+        :param name: sequence name
+        :param offset: byte offset of sequence in fasta file
+        :param sequence: sequence lines of the record
+        """
+        line_ending = 2 if sequence.find(b"\r\n") >= 0 else 1
+        sequence = sequence.rstrip(b"\r\n")
+        if len(sequence) == 0:
+            return FastaIndexRecord(name, 0, offset, 0, 0)
+        first_line_end = sequence.find(b"\n")
+        if first_line_end < 0:
+            return FastaIndexRecord(name, len(sequence), offset, len(sequence), len(sequence) + line_ending)
+        line_width = first_line_end + 1
+        line_bases = line_width - line_ending
+        # Every full line ends at a multiple of line_width and there are no other line endings
+        newlines = sequence[line_width - 1 :: line_width]
+        last_line = len(sequence) - len(newlines) * line_width
+        valid = newlines.count(b"\n") == len(newlines) == sequence.count(b"\n") and 0 < last_line <= line_bases
+        if line_ending == 2:
+            returns = sequence[line_width - 2 :: line_width]
+            valid = valid and returns.count(b"\r") == len(newlines) == sequence.count(b"\r")
+        if not valid:
+            raise FastaIndexException(f"Different line lengths in sequence {name}")
+        return FastaIndexRecord(name, len(newlines) * line_bases + last_line, offset, line_bases, line_width)
+
+    def read_index(self, index_path: str):
+        """
+        Read .fai index file.
+        :param index_path: path to index
+        """
+        self.records = {}
+        with open(index_path, "r") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 5:
+                    raise FastaIndexException(f"Invalid fasta index line: {line.strip()}")
+                name = fields[0]
+                self.records[name] = FastaIndexRecord(name, *[int(field) for field in fields[1:5]])
+
+    def write_index(self, index_path: str):
+        """
+        Write .fai index file.
+        :param index_path: path to index
+        """
+        with open(index_path, "w") as f:
+            for record in self.records.values():
+                f.write(f"{record}\n")
+
+    def fetch(self, region: str) -> str:
+        """
+        Get the bases of a samtools-style region: "name", "name:start" or
+        "name:start-end" with 1-based inclusive coordinates.
+        :param region: region string
+        """
+        if region in self.records:
+            return self.fetch_sequence(region)
+        name, _, interval = region.rpartition(":")
+        start, _, end = interval.replace(",", "").partition("-")
+        try:
+            start = int(start) - 1
+            end   = int(end) if len(end) > 0 else None
+        except ValueError:
+            raise FastaIndexException(f"Invalid region: {region}")
+        return self.fetch_sequence(name, start, end)
+
+    def fetch_sequence(self, name: str, start: int = 0, end: int = None) -> str:
+        """
+        Get bases start to end of a sequence, 0-based and end exclusive.
+        :param name: sequence name
+        :param start: first position
+        :param end: position after the last, defaults to the sequence end
+        """
+        record = self.records.get(name)
+        if record is None:
+            raise FastaIndexException(f"Sequence {name} not found in index {self.index_path}")
+        start = max(start, 0)
+        end   = record.length if end is None else min(end, record.length)
+        if start >= end:
+            return ""
+        byte_start = record.offset + start // record.line_bases * record.line_width + start % record.line_bases
+        byte_end   = record.offset + (end - 1) // record.line_bases * record.line_width + (end - 1) % record.line_bases + 1
+        sequence = self.data[byte_start : byte_end].replace(b"\n", b"")
+        if record.line_width - record.line_bases == 2:
+            sequence = sequence.replace(b"\r", b"")
+        return sequence.decode()
+
+    def close(self):
+        """
+        Close memory map and fasta file.
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __str__(self):
+        return f"FastaIndex(fasta_path={self.fasta_path}, n_seqs={len(self.records)})"
@@ -6,11 +6,13 @@ import os
 class SequenceRead(object):
     """
     Class to handle data associated with a nucleotide or amino acid sequence.
+    Default quality scores are only created when quality_scores is read.
     :param sequence: DNA sequence string
     :param quality_scores: Fastq quality score string
     :param comment: Fastq comment string
     :param name: Name of sequence
     """
+    __slots__ = ("sequence", "_quality_scores", "comment", "name")
     DEFAULT_QUALITY = "I"
     ALPHABET = {
         "A" : "T",
@@ -38,12 +40,25 @@ class SequenceRead(object):
         # Set default quality scores if absent or invalid
         self.set_default_quality()
 
+    @property
+    def quality_scores(self) -> str:
+        """
+        Quality scores, or default quality scores if absent or invalid.
+        """
+        if self._quality_scores is None:
+            return self.DEFAULT_QUALITY * len(self.sequence)
+        return self._quality_scores
+
+    @quality_scores.setter
+    def quality_scores(self, quality_scores: str):
+        self._quality_scores = quality_scores
+
     def set_default_quality(self):
         """
         Set default quality if quality information is absent or invalid
         """
-        if len(self.quality_scores) != len(self.sequence):
-            self.quality_scores = self.DEFAULT_QUALITY * len(self.sequence)
+        if self._quality_scores is not None and len(self._quality_scores) != len(self.sequence):
+            self._quality_scores = None
 
     def from_fastq_string(self, read: str):
         """
@@ -62,17 +77,17 @@ class SequenceRead(object):
         Check sequence against alphabet and replace ambiguous baes
         :param sequence: nucleotide sequence
         """
-        seq = []
-        for base in sequence:
-            if base in SequenceRead.ALPHABET.keys():
-                seq.append(base)
-            else:
-                seq.append("N")
-        return "".join(seq)
+        if sequence.isascii():
+            return sequence.encode().translate(_SANITIZE_TABLE).decode()
+        return "".join(base if base in SequenceRead.ALPHABET else "N" for base in sequence)
 
     def __str__(self):
             return f"@{self.name}\n{self.sequence}\n{self.comment}\n{self.quality_scores}"
 
+# Byte translation table replacing bases outside of SequenceRead.ALPHABET with N
+_SANITIZE_TABLE = bytes(
+    base if chr(base) in SequenceRead.ALPHABET else ord("N") for base in range(256))
+
 
 class SequenceBlock(object):
     """
@@ -89,65 +104,128 @@ class SequenceBlock(object):
 
     def add_sequence_block_from_str(self, sequence: str):
         """
-        Create sequence block from sequence string.
+        Create sequence block from sequence string in a single pass.
         :pararm sequence: string containing sequence data in fasta or fastq format
         """
+        if len(sequence) == 0:
+            return
         if sequence[0] == ">":
-            i = 0
-            while i < len(sequence) -1:
-                seq = ""
-                name = ""
-                while sequence[i] != "\n" and i < len(sequence):
-                    if sequence[i] == ">":
-                        i += 1
-                        name, shift = self._get_until(sequence[i:], "\n")
-                        i += shift + 1
-                    else:
-                        seq_line, shift = self._get_until(sequence[i:], ">")
-                        seq += seq_line
-                        i += shift - 1
-                sr = SequenceRead(name = name, sequence = seq)
-                self.sequences.append(sr)
-                i += 1
+            self._add_fasta_from_str(sequence)
         elif sequence[0] == "@":
-            i = 0
-            while i < len(sequence):
-                if sequence[i] == "@":
-                    i += 1
-                    name = self._get_until(sequence[i:], "\n")
-                    i += (len(name) + 1)
-                    seq  = self._get_until(sequence[i:], "\n")
-                    i += (len(seq) + 1)
-                    comment = self._get_until(sequence[i:], "\n")
-                    i += (len(comment) + 1)
-                    quality = self._get_until(sequence[i:], "\n")
-                    if len(quality) != len(seq):
-                        self.invalid_reads += 1
-                        continue;
-                    i += len(quality) + 1
-                    if i > len(sequence) or sequence[i] == "@":
-                        sr = SequenceRead(
-                            name           = name,
-                            sequence       = seq,
-                            comment        = comment,
-                            quality_scores = quality)
-                        self.sequences.append(sr)
-                    else:
-                        skip = self._get_until(sequence[i:], "@")
-                        i += len(skip) + 1
-                else:
-                    i += 1
+            self._add_fastq_from_str(sequence)
+
+    def _add_fasta_from_str(self, sequence: str):
+        """
+        Add reads from fasta formatted string. Headers without sequence lines
+        are skipped.
+        :param sequence: string containing fasta records
+        """
+        n = len(sequence)
+        i = 0
+        while i < n:
+            name_end = self._find_line_end(sequence, i)
+            seq_end  = sequence.find("\n>", name_end)
+            if seq_end < 0:
+                seq_end = n
+            seq = sequence[name_end + 1 : seq_end]
+            if len(seq) > 0:
+                sr = SequenceRead(
+                    name     = sequence[i + 1 : name_end],
+                    sequence = seq.replace("\n", ""))
+                self.sequences.append(sr)
+            i = seq_end + 1
+
+    def _add_fastq_from_str(self, sequence: str):
+        """
+        Add reads from fastq formatted string. Records whose quality length
+        does not match their sequence length are counted as invalid and
+        parsing resumes at the next line starting with "@" after the record,
+        or after its header if the record has no "+" line.
+        :param sequence: string containing fastq records
+        """
+        n = len(sequence)
+        i = 0
+        while i < n:
+            if sequence[i] != "@":
+                i = self._find_line_end(sequence, i) + 1
+                continue
+            name_end    = self._find_line_end(sequence, i)
+            seq_end     = self._find_line_end(sequence, name_end + 1)
+            comment_end = self._find_line_end(sequence, seq_end + 1)
+            quality_end = self._find_line_end(sequence, comment_end + 1)
+            seq     = sequence[name_end + 1 : seq_end]
+            quality = sequence[comment_end + 1 : quality_end]
+            comment = sequence[seq_end + 1 : comment_end]
+            if len(quality) != len(seq):
+                self.invalid_reads += 1
+                i = quality_end + 1 if comment.startswith("+") else name_end + 1
+                continue
+            sr = SequenceRead(
+                name           = sequence[i + 1 : name_end],
+                sequence       = seq,
+                comment        = comment,
+                quality_scores = quality)
+            self.sequences.append(sr)
+            i = quality_end + 1
 
     @staticmethod
-    def _get_until(string: str, char: str):
+    def _find_line_end(string: str, start: int) -> int:
+        """
+        Return index of the newline ending the line at start, or the string
+        length for the last line.
+        :param string: string to search
+        :param start: index in line
+        """
+        end = string.find("\n", start)
+        return end if end >= 0 else max(start, len(string))
+
+    def get_names(self) -> list:
         """
-        Return string leading up to where char is found with newlines removed.
-        :param string: string to get characters from
-        :param char: char to search for
+        Get names of all reads.
         """
-        r = string.split(char)[0]
-        l = len(r)
-        return r.replace("\n", ""), l
+        return [read.name for read in self.sequences]
+
+    def get_sequences(self) -> list:
+        """
+        Get sequence strings of all reads.
+        """
+        return [read.sequence for read in self.sequences]
+
+    def get_lengths(self) -> list:
+        """
+        Get sequence lengths of all reads.
+        """
+        return [len(read.sequence) for read in self.sequences]
+
+    def get_bases(self, start: int, end: int) -> str:
+        """
+        Get concatenated sequences of reads start to end.
+        :param start: index of first read
+        :param end: index after last read
+        """
+        return "".join(read.sequence for read in self.sequences[start:end])
+
+    def slice(self, start: int, end: int):
+        """
+        Get block holding reads start to end.
+        :param start: index of first read
+        :param end: index after last read
+        """
+        block = SequenceBlock()
+        block.sequences = self.sequences[start:end]
+        return block
+
+    def select(self, reads: list):
+        """
+        Get block holding the given reads.
+        :param reads: indices of reads
+        """
+        block = SequenceBlock()
+        block.sequences = [self.sequences[i] for i in reads]
+        return block
+
+    def __len__(self):
+        return len(self.sequences)
 
     def __str__(self):
         return f"SequenceBlock(n_seqs={len(self.sequences)})"
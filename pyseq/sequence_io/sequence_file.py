@@ -1,29 +1,40 @@
 import os
 import sys
-import gzip
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from .sequence_block import SequenceBlock, SequenceRead
-from .sequence_io_utils import is_gz_file, is_fastq, is_fasta
+from .columnar_block import ColumnarBlock
+from .sequence_io_utils import is_fastq, is_fasta
+from .decompression import DecompressedFile
+from .fasta_index import FastaIndex
+
+# Number of bytes read from a sequence file at once
+BUFFER_SIZE = 1 << 22
 
 class SequenceFile(object):
     """
-    Class for fastq/a IO.
+    Class for fastq/a IO. Files may be gzip, bzip2, xz or zstd compressed.
+    :param use_subprocess: decompress with an installed command line tool such as pigz if available
+    :param background: decompress in a background thread while parsing, by
+        default if the file is compressed and more than one CPU is available
     """
-    def __init__(self):
+    def __init__(self, use_subprocess: bool = False, background: bool = None):
         super(SequenceFile, self).__init__()
         self.sequence_blocks = []
+        self.use_subprocess  = use_subprocess
+        self.background      = background
 
     def load_single_sequence_block(self, file : str):
         """
         Read entire contents of provided file into a single sequence block
         :param file: path to input fasta or fastq file
         """
-        f = self._open(file)
-        seq_data = f.read()
+        with self._open(file) as f:
+            seq_data = self._decode(f.read())
         block = SequenceBlock()
         block.add_sequence_block_from_str(seq_data)
         self.sequence_blocks.append(block)
-        f.close()
 
     def load_sequence_blocks_from_file(self,
         file       : str,
@@ -35,27 +46,7 @@ class SequenceFile(object):
         :param max_chunks: maximum number of chunks
         """
         # Parse fastq/a file
-        f = self._open(file)
-        reads = []
-        line = f.readline()
-        while len(line) > 0:
-            if is_fasta(line[0]):
-                read = SequenceRead(name = line.strip().replace(">", ""))
-                line = f.readline().strip()
-                while len(line) > 0 and not is_fasta(line[0]):
-                    read.sequence += line.strip()
-                    line = f.readline().strip()
-                read.set_default_quality()
-                reads.append(read)
-            elif is_fastq(line[0]):
-                fq = line
-                for i in range(0, 3):
-                    fq += f.readline()
-                read = SequenceRead()
-                read.from_fastq_string(fq)
-                reads.append(read)
-                line = f.readline()
-        f.close()
+        reads = list(self.iter_reads(file))
         # Get chunk parameters
         n_chunks = int(len(reads) / chunksize) + 1
         if n_chunks > max_chunks:
@@ -76,13 +67,313 @@ class SequenceFile(object):
                 block.sequences.append(reads[j])
             self.sequence_blocks.append(block)
 
-    def _open(self, input_file):
+    def load_sequences_from_index(self, file: str, names: list):
+        """
+        Load selected sequences of an uncompressed fasta file into a single
+        sequence block, reading them through a .fai index that is built if
+        missing. Names are matched to index entries by their first word and
+        names missing from the index are skipped.
+        :param file: path to fasta file
+        :param names: iterable of sequence names
+        """
+        block = SequenceBlock()
+        with FastaIndex(file) as index:
+            for name in names:
+                words = name.split()
+                sequence_name = words[0] if len(words) > 0 else name
+                if sequence_name in index:
+                    block.sequences.append(SequenceRead(name = name, sequence = index.fetch_sequence(sequence_name)))
+        self.sequence_blocks.append(block)
+
+    def iter_blocks(self,
+        file            : str,
+        reads_per_block : int = 100000,
+        columnar        : bool = False,
+        threads         : int = 1):
+        """
+        Iterate over fixed-size sequence blocks while reading a fastq/a file,
+        so files larger than memory can be processed one block at a time.
+        Blocks are yielded, not added to sequence_blocks. With more than one
+        thread, uncompressed fastq files are split into record-aligned byte
+        ranges parsed by worker processes, block sizes are then approximate.
+        :param file: path to input fasta or fastq file
+        :param reads_per_block: number of reads per block, the last block may be smaller
+        :param columnar: yield ColumnarBlocks instead of SequenceBlocks
+        :param threads: number of worker processes used to parse uncompressed fastq
+        """
+        if threads > 1 and self._is_uncompressed_fastq(file):
+            yield from self._iter_blocks_parallel(file, reads_per_block, columnar, threads)
+            return
+        if not columnar:
+            block = SequenceBlock()
+            for read in self.iter_reads(file):
+                block.sequences.append(read)
+                if len(block.sequences) >= reads_per_block:
+                    yield block
+                    block = SequenceBlock()
+            if len(block.sequences) > 0:
+                yield block
+            return
+        block = ColumnarBlock()
+        for name, sequence, _, quality_scores in self._iter_records(file):
+            block.add_read(name, sequence, quality_scores)
+            if len(block) >= reads_per_block:
+                yield block
+                block = ColumnarBlock()
+        if len(block) > 0:
+            yield block
+
+    def _iter_blocks_parallel(self, file: str, reads_per_block: int, columnar: bool, threads: int):
         """
-        Open file object for reading.
+        Parse an uncompressed fastq file in a process pool, yielding blocks in
+        file order. Byte ranges are sized from the mean record length of the
+        start of the file to hold about reads_per_block reads each.
+        :param file: path to uncompressed fastq file
+        :param reads_per_block: approximate number of reads per block
+        :param columnar: yield ColumnarBlocks instead of SequenceBlocks
+        :param threads: number of worker processes
+        """
+        file_size = os.path.getsize(file)
+        with open(file, "rb") as f:
+            head = f.read(BUFFER_SIZE)
+            n_records = max(head.count(b"\n") // 4, 1)
+            range_size = max(len(head) // n_records * reads_per_block, 1)
+            starts = [0]
+            for offset in range(range_size, file_size, range_size):
+                start = self._find_fastq_record_start(f, offset)
+                if start > starts[-1] and start < file_size:
+                    starts.append(start)
+        ranges = zip(starts, starts[1:] + [file_size])
+        with ProcessPoolExecutor(max_workers = threads) as executor:
+            # Bound the number of ranges in flight so blocks can be streamed
+            pending = deque()
+            for start, end in ranges:
+                pending.append(executor.submit(_parse_fastq_range, file, start, end, columnar))
+                if len(pending) > threads * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @staticmethod
+    def _find_fastq_record_start(f, offset: int) -> int:
+        """
+        Find the first fastq record starting after offset. A line is a record
+        header if it starts with "@", the line after next starts with "+" and
+        sequence and quality lines have equal length, so quality lines
+        starting with "@" are not mistaken for headers.
+        :param f: binary file object
+        :param offset: byte offset to search from
+        :return: byte offset of record header, or the file size if there is none
+        """
+        window = 1 << 16
+        while True:
+            f.seek(offset)
+            data = f.read(window)
+            at_end = len(data) < window
+            candidate = data.find(b"\n@")
+            while candidate >= 0:
+                lines = data[candidate + 1:].split(b"\n", 4)
+                if len(lines) < 5 and not at_end:
+                    break
+                if len(lines) >= 4 and lines[2][:1] == b"+" and \
+                        len(lines[1].rstrip(b"\r")) == len(lines[3].rstrip(b"\r")):
+                    return offset + candidate + 1
+                candidate = data.find(b"\n@", candidate + 1)
+            if at_end:
+                return offset + len(data)
+            if candidate < 0:
+                # Keep the last partial line so a header on it is not skipped
+                last_line = data.rfind(b"\n")
+                offset += last_line if last_line > 0 else len(data) - 1
+            else:
+                window *= 2
+
+    def _is_uncompressed_fastq(self, file: str) -> bool:
+        """
+        Check if a file is uncompressed and its first record is a fastq record.
+        :param file: path to input fasta or fastq file
+        """
+        with DecompressedFile(file) as f:
+            if f.compression is not None:
+                return False
+            for line in f.raw:
+                if line[:1] in (b">", b"@"):
+                    return is_fastq(line[:1].decode())
+        return False
+
+    def iter_reads(self, file: str, buffer_size: int = BUFFER_SIZE):
+        """
+        Iterate over reads in a fastq/a file without loading the whole file.
+        The file is read in large binary buffers and only complete records
+        are decoded and parsed, records spanning two buffers are carried
+        over to the next one. The format is taken from the first record.
+        :param file: path to input fasta or fastq file
+        :param buffer_size: number of bytes read at once
+        """
+        for name, sequence, comment, quality_scores in self._iter_records(file, buffer_size):
+            read = SequenceRead()
+            read.name           = name
+            read.sequence       = sequence
+            read.comment        = comment
+            read.quality_scores = quality_scores
+            yield read
+
+    def _iter_records(self, file: str, buffer_size: int = BUFFER_SIZE):
+        """
+        Iterate over records of a fastq/a file as (name, sequence, comment,
+        quality_scores) tuples, quality_scores is None for fasta records.
+        :param file: path to input fasta or fastq file
+        :param buffer_size: number of bytes read at once
+        """
+        f = self._open(file)
+        try:
+            buffer = f.read(buffer_size)
+            # Skip lines before the first record
+            while len(buffer) > 0 and buffer[:1] not in (b">", b"@"):
+                line_end = buffer.find(b"\n")
+                if line_end < 0:
+                    buffer = f.read(buffer_size)
+                else:
+                    buffer = buffer[line_end + 1:]
+                    if len(buffer) == 0:
+                        buffer = f.read(buffer_size)
+            if is_fasta(buffer[:1].decode()):
+                yield from self._iter_fasta_records(f, buffer, buffer_size)
+            elif is_fastq(buffer[:1].decode()):
+                yield from self._iter_fastq_records(f, buffer, buffer_size)
+        finally:
+            f.close()
+
+    def _iter_fasta_records(self, f, buffer: bytes, buffer_size: int):
+        """
+        Iterate over fasta records, splitting the file after the last record
+        header of each buffer. Buffers without a header are collected until
+        one is found so long records are joined only once.
+        :param f: binary file object positioned after buffer
+        :param buffer: bytes read so far, starting at a record
+        :param buffer_size: number of bytes read at once
+        """
+        pending = [buffer]
+        while len(pending) > 0:
+            data = f.read(buffer_size)
+            if len(data) == 0:
+                records = b"".join(pending)
+                pending = []
+            else:
+                cut = data.rfind(b"\n>")
+                if cut < 0:
+                    pending.append(data)
+                    continue
+                pending.append(data[:cut + 1])
+                records = b"".join(pending)
+                pending = [data[cut + 1:]]
+            yield from self._parse_fasta(self._decode(records))
+
+    def _iter_fastq_records(self, f, buffer: bytes, buffer_size: int):
+        """
+        Iterate over fastq records. Complete lines of each buffer are parsed and
+        the lines of a trailing incomplete record are carried over.
+        :param f: binary file object positioned after buffer
+        :param buffer: bytes read so far, starting at a record
+        :param buffer_size: number of bytes read at once
+        """
+        carry = buffer
+        final = False
+        while not final:
+            data  = f.read(buffer_size)
+            final = len(data) == 0
+            chunk = carry + data
+            lines_end = len(chunk) if final else chunk.rfind(b"\n") + 1
+            lines = self._decode(chunk[:lines_end]).split("\n")
+            if not final or lines[-1] == "":
+                lines.pop()
+            records, consumed = self._parse_fastq(lines, final)
+            yield from records
+            carry = chunk[lines_end:]
+            if consumed < len(lines):
+                carry = ("\n".join(lines[consumed:]) + "\n").encode() + carry
+
+    @staticmethod
+    def _parse_fasta(records: str) -> list:
+        """
+        Parse records from a string of complete fasta records. Surrounding
+        whitespace of names and sequence lines is removed.
+        :param records: fasta records, starting with ">"
+        """
+        parsed = []
+        for record in records[1:].split("\n>"):
+            name, _, sequence = record.partition("\n")
+            name = name.strip().replace(">", "")
+            parsed.append((name, "".join(line.strip() for line in sequence.split("\n")), "+", None))
+        return parsed
+
+    @staticmethod
+    def _parse_fastq(lines: list, final: bool) -> tuple:
+        """
+        Parse records from fastq lines. Lines outside of records are skipped.
+        :param lines: list of lines without line endings
+        :param final: whether lines end the file, a truncated last record is dropped
+        :return: (list of records, number of lines consumed)
+        """
+        parsed = []
+        n = len(lines)
+        i = 0
+        while i < n:
+            if not is_fastq(lines[i][:1]):
+                i += 1
+                continue
+            if i + 3 >= n:
+                if final:
+                    i = n
+                break
+            parsed.append((lines[i].replace("@", ""), lines[i + 1], lines[i + 2], lines[i + 3]))
+            i += 4
+        return parsed, i
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        """
+        Decode complete lines read in binary mode, converting Windows line endings.
+        :param data: bytes ending at a line boundary
+        """
+        text = data.decode()
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        return text
+
+    def _open(self, input_file) -> DecompressedFile:
+        """
+        Open binary file object reading decompressed data.
         :param input_file: path to file
         """
-        if is_gz_file(input_file):
-            f = gzip.open(input_file, "rt")
+        return DecompressedFile(input_file, self.use_subprocess, self.background)
+
+
+def _parse_fastq_range(file: str, start: int, end: int, columnar: bool):
+    """
+    Parse the fastq records in a byte range of an uncompressed file in a
+    worker process.
+    :param file: path to uncompressed fastq file
+    :param start: byte offset of the first record
+    :param end: byte offset after the last record
+    :param columnar: return a ColumnarBlock instead of a SequenceBlock
+    """
+    with open(file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = SequenceFile._decode(data).split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    records, _ = SequenceFile._parse_fastq(lines, True)
+    block = ColumnarBlock() if columnar else SequenceBlock()
+    for name, sequence, comment, quality_scores in records:
+        if columnar:
+            block.add_read(name, sequence, quality_scores)
         else:
-            f = open(input_file, "r")
-        return f
+            read = SequenceRead()
+            read.name           = name
+            read.sequence       = sequence
+            read.comment        = comment
+            read.quality_scores = quality_scores
+            block.sequences.append(read)
+    return block
@@ -0,0 +1,150 @@
+import os
+import re
+import gzip
+from io import BytesIO
+from collections import OrderedDict
+
+class SplitWriterException(Exception): pass
+
+SPLIT_FORMATS = ("fastq", "fasta")
+
+# File name of reads without a key, e.g. unassigned reads, no key can use it
+UNCLASSIFIED = "unclassified"
+
+# zlib's default level, several times faster than gzip's default of 9
+GZIP_COMPRESSLEVEL = 6
+
+
+class SplitFileWriter(object):
+    """
+    Write reads to one fastq or fasta file per key, e.g. per bin, and reads
+    without a key to the unclassified file. Reads are buffered per key and
+    written in large chunks once all buffers together hold buffer_size bytes.
+    At most max_open_files files are open at once, the least recently written
+    file is closed to open another and reopened for appending when needed; a
+    reopened gzip file gains a gzip member.
+    :param output_dir: directory of output files, created if missing
+    :param file_format: "fastq" or "fasta"
+    :param compress: gzip output files
+    :param max_open_files: maximum number of open files
+    :param buffer_size: number of buffered bytes written at once
+    """
+    def __init__(self,
+        output_dir     : str,
+        file_format    : str = "fastq",
+        compress       : bool = False,
+        max_open_files : int = 64,
+        buffer_size    : int = 1 << 26):
+        super(SplitFileWriter, self).__init__()
+        if file_format not in SPLIT_FORMATS:
+            raise SplitWriterException(f"Unsupported split file format: {file_format}")
+        if max_open_files < 1:
+            raise SplitWriterException(f"At least one open file is required: {max_open_files}")
+        self.output_dir     = output_dir
+        self.file_format    = file_format
+        self.compress       = compress
+        self.max_open_files = max_open_files
+        self.buffer_size    = buffer_size
+        self.buffers        = {}
+        self.paths          = {}
+        self.names          = set()
+        self.created        = set()
+        self.files          = OrderedDict()
+        self.n_buffered     = 0
+        self.n_opens        = 0
+        os.makedirs(output_dir, exist_ok = True)
+
+    def get_path(self, key: str) -> str:
+        """
+        Get output path of a key, assigned on first use. Characters other than
+        letters, digits and ._+- are replaced with _, and names used by an
+        earlier key or reserved for reads without a key get a numbered suffix,
+        so every key has its own file.
+        :param key: name of output file without extension, e.g. bin name, None for unclassified
+        """
+        path = self.paths.get(key)
+        if path is not None:
+            return path
+        if key is None:
+            name = UNCLASSIFIED
+        else:
+            name = base = re.sub(r"[^\w.+-]", "_", key)
+            suffix = 1
+            while name in self.names or name == UNCLASSIFIED:
+                suffix += 1
+                name = f"{base}_{suffix}"
+        self.names.add(name)
+        path = self.paths[key] = os.path.join(
+            self.output_dir, f"{name}.{self.file_format}" + (".gz" if self.compress else ""))
+        return path
+
+    def write(self, key: str, block, reads = None):
+        """
+        Buffer reads of a block for the output file of a key.
+        :param key: name of output file without extension, e.g. bin name, None for unclassified
+        :param block: ColumnarBlock containing reads
+        :param reads: indices of reads to write, defaults to all reads
+        """
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = BytesIO()
+        start = buffer.tell()
+        if self.file_format == "fastq":
+            block.write_fastq(buffer, reads)
+        else:
+            block.write_fasta(buffer, reads)
+        self.n_buffered += buffer.tell() - start
+        if self.n_buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered reads to their files.
+        """
+        for key, buffer in self.buffers.items():
+            if buffer.tell() > 0:
+                self._get_file(key).write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        self.n_buffered = 0
+
+    def _get_file(self, key: str):
+        """
+        Get open file of a key, closing the least recently written file if
+        max_open_files are open. Files are created on first use and appended
+        to when reopened.
+        :param key: name of output file without extension, None for unclassified
+        """
+        f = self.files.get(key)
+        if f is not None:
+            self.files.move_to_end(key)
+            return f
+        if len(self.files) >= self.max_open_files:
+            self.files.popitem(last = False)[1].close()
+        path = self.get_path(key)
+        mode = "ab" if path in self.created else "wb"
+        self.created.add(path)
+        if self.compress:
+            f = gzip.open(path, mode, compresslevel = GZIP_COMPRESSLEVEL)
+        else:
+            f = open(path, mode)
+        self.files[key] = f
+        self.n_opens += 1
+        return f
+
+    def close(self):
+        """
+        Write all buffered reads and close files.
+        """
+        self.flush()
+        while self.files:
+            self.files.popitem()[1].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __str__(self):
+        return f"SplitFileWriter(output_dir={self.output_dir}, n_files={len(self.created)})"
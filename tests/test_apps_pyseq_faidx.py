@@ -0,0 +1,22 @@
+import os
+import sys
+import pytest
+from pyseq.apps import pyseq_faidx
+
+
+def test_faidx(monkeypatch):
+    with open("tmp.fasta", "w") as f:
+        f.write(">ref_1\nACGTACGT\nACGT\n>ref_2\nGGGG\n")
+
+    monkeypatch.setattr(sys, "argv", ["pyseq", "faidx", "-r", "tmp.fasta", "-o", "tmp.out.fasta", "ref_1:3-10", "ref_2"])
+    pyseq_faidx.main()
+    with open("tmp.out.fasta") as f:
+        assert f.read() == ">ref_1:3-10\nGTACGTAC\n>ref_2\nGGGG\n"
+    # Unknown sequence names exit with a message instead of a traceback
+    monkeypatch.setattr(sys, "argv", ["pyseq", "faidx", "-r", "tmp.fasta", "-o", "tmp.out.fasta", "ref_3"])
+    with pytest.raises(SystemExit) as e:
+        pyseq_faidx.main()
+    assert str(e.value).startswith("pyseq faidx: ") and "ref_3" in str(e.value)
+    os.remove("tmp.fasta")
+    os.remove("tmp.fasta.fai")
+    os.remove("tmp.out.fasta")
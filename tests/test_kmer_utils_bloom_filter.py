@@ -0,0 +1,30 @@
+import os
+import random
+import pytest
+from pyseq.kmer_utils import bloom_filter
+from pyseq.kmer_utils.bloom_filter import BloomFilter
+
+np = pytest.importorskip("numpy")
+
+
+def test_bloom_filter_false_positive_rate():
+    rng = np.random.default_rng(0)
+    present = np.unique(rng.integers(0, 1 << 38, 20000, dtype = np.uint64))
+    absent  = rng.integers(1 << 38, 1 << 39, 200000, dtype = np.uint64)
+    for fpr in [0.1, 0.01]:
+        bloom = BloomFilter.build(present, fpr)
+        assert bloom.contains(present).all()
+        assert bloom.contains(absent).mean() < fpr * 1.3
+    # Scalar lookups agree with array lookups
+    assert all(int(minimizer) in bloom for minimizer in present[:500])
+    assert [int(minimizer) in bloom for minimizer in absent[:500]] == bloom.contains(absent[:500]).tolist()
+
+
+def test_bloom_filter_without_numpy(monkeypatch):
+    random.seed(0)
+    minimizers = random.sample(range(1 << 38), 2000)
+    expected = BloomFilter.build(np.array(minimizers, dtype = np.uint64), 0.01)
+    monkeypatch.setattr(bloom_filter, "np", None)
+    bloom = BloomFilter.build(minimizers, 0.01)
+    assert bloom.words == expected.words
+    assert all(minimizer in bloom for minimizer in minimizers)
@@ -0,0 +1,34 @@
+import os
+import random
+import pytest
+from pyseq.kmer_utils import get_minimized_kmers
+from pyseq.sequence_io import SequenceBlock, SequenceRead
+
+np = pytest.importorskip("numpy")
+from pyseq.kmer_utils.kmer_batch import get_block_minimizers
+
+
+def test_block_minimizers_match_get_minimized_kmers():
+    random.seed(0)
+    block = SequenceBlock()
+    for i in range(50):
+        length   = random.choice([0, 10, 31, 150, 400])
+        sequence = "".join(random.choice("ACGTN" if random.random() < 0.02 else "ACGT") for _ in range(length))
+        block.sequences.append(SequenceRead(name = f"read_{i}", sequence = sequence))
+
+    for kmer_length, minimizer_length, batch_bases in [(31, 19, 1 << 16), (25, 11, 500), (15, 15, 1)]:
+        read_index, minimizers, kmer_counts = get_block_minimizers(
+            block, kmer_length, minimizer_length, 0.2, batch_bases = batch_bases)
+        expected = []
+        for i, read in enumerate(block.sequences):
+            minimized = get_minimized_kmers(read.sequence, kmer_length, minimizer_length, 0.2)
+            expected.extend([(i, minimizer, n) for minimizer, n in minimized.items()])
+        observed = list(zip(read_index.tolist(), minimizers.tolist(), kmer_counts.tolist()))
+        assert observed == expected
+
+
+def test_block_minimizers_empty():
+    read_index, minimizers, kmer_counts = get_block_minimizers(SequenceBlock(), 31, 19, 0.2)
+    assert len(read_index) == 0
+    assert len(minimizers) == 0
+    assert len(kmer_counts) == 0
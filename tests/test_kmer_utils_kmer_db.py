@@ -0,0 +1,248 @@
+import os
+import random
+import pytest
+from pyseq.kmer_utils import KmerDb, BinSummary, ReadMemo
+from pyseq.kmer_utils import kmer_db as kmer_db_module
+from pyseq.sequence_io import SequenceFile, SequenceBlock, SequenceRead, ColumnarBlock
+
+
+def make_references(n_references = 6, length = 3000):
+    random.seed(0)
+    genome = "".join(random.choice("ACGT") for _ in range(length))
+    reference = SequenceFile()
+    bins = {}
+    for i in range(n_references):
+        block = SequenceBlock()
+        sequence = "".join(random.choice("ACGT") if random.random() < 0.05 else b for b in genome)
+        block.sequences.append(SequenceRead(name = f"ref_{i}", sequence = sequence))
+        reference.sequence_blocks.append(block)
+        bins[f"ref_{i}"] = f"bin_{i % 4}"
+    return reference, bins
+
+
+def db_contents(kmer_db):
+    return [(minimizer, [(bin_id, r.unweighted) for bin_id, r in bins.items()])
+        for minimizer, bins in kmer_db.kmers.items()]
+
+
+def build_db():
+    reference, bins = make_references()
+    kmer_db = KmerDb(21, 11)
+    kmer_db.build_kmer_database(reference, bins, 2)
+    return kmer_db, reference
+
+
+def sample_reads(reference, n_reads, seed, length = 100):
+    random.seed(seed)
+    sequences = []
+    for i in range(n_reads):
+        ref = random.choice(reference.sequence_blocks).sequences[0].sequence
+        start = random.randrange(0, len(ref) - length)
+        sequences.append(ref[start : start + length])
+    return sequences
+
+
+def test_parallel_build():
+    reference, bins = make_references()
+    serial = KmerDb(21, 11)
+    serial.build_kmer_database(reference, bins, 2)
+    parallel = KmerDb(21, 11)
+    parallel.build_kmer_database(reference, bins, 2, threads = 3)
+    assert db_contents(parallel) == db_contents(serial)
+    assert parallel.bin_counts == serial.bin_counts
+    assert parallel.reference_count == serial.reference_count
+
+
+def test_parallel_bin_blocks():
+    kmer_db, reference = build_db()
+    sequences = sample_reads(reference, 75, 1)
+    blocks = []
+    for i in range(3):
+        block = SequenceBlock()
+        for j in range(25):
+            block.sequences.append(SequenceRead(name = f"read_{i}_{j}", sequence = sequences[i * 25 + j]))
+        blocks.append(block)
+    expected = [kmer_db.bin_reads(block) for block in blocks]
+    observed = list(kmer_db.bin_blocks(blocks, threads = 2))
+    assert observed == expected
+    for block_results, block in zip(observed, blocks):
+        assert list(block_results.keys()) == [read.name for read in block.sequences]
+
+
+def test_columnar_bin_blocks(monkeypatch):
+    kmer_db, reference = build_db()
+    block = SequenceBlock()
+    for i, sequence in enumerate(sample_reads(reference, 25, 2)):
+        block.sequences.append(SequenceRead(name = f"read_{i}", sequence = sequence))
+    expected = kmer_db.bin_reads(block)
+    columnar = ColumnarBlock.from_reads(block.sequences)
+    assert kmer_db.bin_reads(columnar) == expected
+    # Columnar blocks are sliced into worker tasks
+    monkeypatch.setattr(kmer_db_module, "READS_PER_TASK", 10)
+    assert list(kmer_db.bin_blocks([columnar], threads = 2)) == [expected]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_early_exit(monkeypatch, use_numpy):
+    kmer_db, reference = build_db()
+    block = ColumnarBlock()
+    for i, ref_block in enumerate(reference.sequence_blocks):
+        sequence = ref_block.sequences[0].sequence
+        block.add_read(f"read_{i}", sequence[500 : 2500])
+    block.add_read("short", "ACGT")
+    if not use_numpy:
+        monkeypatch.setattr(kmer_db_module, "np", None)
+    full = kmer_db.query_block(block)
+    results, skipped = kmer_db.query_block_early_exit(block, 1.0, segment_length = 100)
+    assert skipped[-1] == 0 and results[-1] == {}
+    assert sum(skipped) > 0
+    for full_counts, counts, n_skipped in zip(full, results, skipped):
+        # The assigned bin never changes with a margin of 1
+        assert kmer_db.assign_sequence_to_bin(counts) == kmer_db.assign_sequence_to_bin(full_counts)
+        queried = sum(r.unweighted for r in counts.values())
+        assert queried <= sum(r.unweighted for r in full_counts.values())
+    # Smaller margins stop earlier
+    _, skipped_early = kmer_db.query_block_early_exit(block, 0.1, segment_length = 100)
+    assert all(a >= b for a, b in zip(skipped_early, skipped)) and sum(skipped_early) > sum(skipped)
+    # Reads decided in their first segment give the same counts as full queries
+    results, skipped = kmer_db.query_block_early_exit(block, 1.0, segment_length = 5000)
+    assert skipped == [0] * len(block)
+    assert [{b : r.to_dict() for b, r in c.items()} for c in results] == \
+        [{b : r.to_dict() for b, r in c.items()} for c in full]
+    binned = kmer_db.bin_reads(block, early_exit = 1.0)
+    assert all("skipped_kmers" in result for result in binned.values())
+    assert list(kmer_db.bin_blocks([block], threads = 2, early_exit = 1.0)) == [binned]
+    assert "skipped_kmers" not in kmer_db.bin_reads(block)["read_0"]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_filter_block(monkeypatch, use_numpy):
+    kmer_db, reference = build_db()
+    random.seed(3)
+    block = ColumnarBlock()
+    for i, ref_block in enumerate(reference.sequence_blocks):
+        block.add_read(f"read_{i}", ref_block.sequences[0].sequence[1000 : 1400])
+    block.add_read("random", "".join(random.choice("ACGT") for _ in range(400)))
+    block.add_read("short", "ACGT")
+    if not use_numpy:
+        monkeypatch.setattr(kmer_db_module, "np", None)
+    all_hits = [kmer_db.count_hits(sequence) for sequence in block.get_sequences()]
+    assert all_hits[-2:] == [0, 0] and min(all_hits[:-2]) > 10
+    for min_hits in (1, 10, 1000):
+        hits = kmer_db.filter_block(block, min_hits, segment_length = 50)
+        assert [n >= min_hits for n in hits] == [n >= min_hits for n in all_hits]
+    # Queries stop at the segment reaching min_hits
+    assert max(kmer_db.filter_block(block, 1, segment_length = 50)) < max(all_hits)
+    bin_hits = kmer_db.filter_block(block, 1000, {"bin_1"})
+    assert bin_hits == [kmer_db.count_hits(sequence, bins = {"bin_1"}) for sequence in block.get_sequences()]
+    assert bin_hits[1] == all_hits[1] and 0 < bin_hits[0] < all_hits[0]
+    # Minimizers shared by more bins than the ambiguity threshold hit the ambiguous bin
+    ambiguous_hits = kmer_db.filter_block(block, 1000, {kmer_db_module.AMBIGUOUS_BIN})
+    assert 0 < ambiguous_hits[0] < all_hits[0]
+    filtered = list(kmer_db.filter_blocks([block, block.slice(0, 2)], threads = 2, min_hits = 10))
+    assert [hits for _, hits in filtered] == [kmer_db.filter_block(block, 10), kmer_db.filter_block(block.slice(0, 2), 10)]
+
+
+def test_summarize_blocks():
+    kmer_db, reference = build_db()
+    sequences = sample_reads(reference, 60, 4)
+    blocks = []
+    for i in range(3):
+        block = ColumnarBlock()
+        for j in range(20):
+            block.add_read(f"read_{i}_{j}", sequences[i * 20 + j])
+        block.add_read(f"random_{i}", "".join(random.choice("ACGT") for _ in range(100)))
+        blocks.append(block)
+    expected = BinSummary()
+    for block in blocks:
+        expected.add_results(kmer_db.bin_reads(block))
+    summary = kmer_db.summarize_blocks(blocks)
+    assert summary.n_reads == 63 and summary.reads[BinSummary.UNCLASSIFIED] == 3
+    assert summary.to_rows() == expected.to_rows()
+    assert kmer_db.summarize_blocks(blocks, threads = 2).to_rows() == expected.to_rows()
+    rows = summary.to_rows()
+    assert [row["reads"] for row in rows] == sorted((row["reads"] for row in rows), reverse = True)
+    assert sum(row["reads"] for row in rows) == 63
+    early = kmer_db.summarize_blocks(blocks, early_exit = 1.0)
+    assert early.reads == summary.reads and early.skipped_kmers == 0
+
+
+def test_bin_blocks_memo():
+    kmer_db, reference = build_db()
+    sequences = sample_reads(reference, 10, 5)
+    blocks = []
+    for i in range(4):
+        block = ColumnarBlock()
+        for j in range(30):
+            block.add_read(f"read_{i}_{j}", random.choice(sequences))
+        blocks.append(block)
+    expected = [kmer_db.bin_reads(block) for block in blocks]
+    memo = ReadMemo(100)
+    assert list(kmer_db.bin_blocks(blocks, memo = memo)) == expected
+    assert memo.lookups == 120 and memo.hits == 120 - len(set(sequences))
+    # Results are reused from the first blocks, also when binned by worker processes
+    assert list(kmer_db.bin_blocks(blocks, threads = 2, memo = memo)) == expected
+    assert memo.hits == 240 - len(set(sequences))
+    small_memo = ReadMemo(2)
+    assert list(kmer_db.bin_blocks(blocks, threads = 2, early_exit = 1.0, memo = small_memo)) == \
+        [kmer_db.bin_reads(block, early_exit = 1.0) for block in blocks]
+    assert len(small_memo) == 2
+
+
+def build_subset(reference, bins, indices):
+    subset = SequenceFile()
+    subset.sequence_blocks = [reference.sequence_blocks[i] for i in indices]
+    kmer_db = KmerDb(21, 11)
+    kmer_db.build_kmer_database(subset, bins, 2)
+    return kmer_db
+
+
+def sorted_contents(kmer_db):
+    return sorted((minimizer, sorted(bins)) for minimizer, bins in kmer_db.iter_minimizer_bins())
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_update_database(compact):
+    reference, bins = make_references()
+    expected = build_subset(reference, bins, range(6))
+    kmer_db = build_subset(reference, bins, range(5))
+    if compact:
+        kmer_db.compact()
+    kmer_db.update_database(added = build_subset(reference, bins, [5]))
+    assert sorted_contents(kmer_db) == sorted_contents(expected)
+    assert kmer_db.bin_counts == expected.bin_counts
+    assert kmer_db.reference_count == expected.reference_count
+    # Removing the reference again restores the smaller database
+    kmer_db.update_database(removed = build_subset(reference, bins, [5]))
+    assert sorted_contents(kmer_db) == sorted_contents(build_subset(reference, bins, range(5)))
+    # Removing a bin equals building without its references
+    kmer_db.update_database(remove_bins = ["bin_0"])
+    expected = build_subset(reference, bins, [1, 2, 3])
+    assert sorted_contents(kmer_db) == sorted_contents(expected)
+    assert kmer_db.bin_counts == expected.bin_counts
+
+
+def test_update_written_database():
+    reference, bins = make_references()
+    kmer_db = build_subset(reference, bins, range(5))
+    kmer_db.write_pyseq_dbi("test_update.dbi")
+    loaded = KmerDb(21, 11)
+    loaded.load_pyseq_dbi("test_update.dbi")
+    loaded.update_database(added = build_subset(reference, bins, [5]))
+    loaded.write_pyseq_dbi("test_update.dbi")
+    updated = KmerDb(21, 11)
+    updated.load_pyseq_dbi("test_update.dbi")
+    expected = build_subset(reference, bins, range(6))
+    assert sorted_contents(updated) == sorted_contents(expected)
+    assert updated.bin_threshold == expected.bin_threshold
+    # Ambiguity is recomputed at query time from the raw counts
+    sequence = reference.sequence_blocks[0].sequences[0].sequence[:200]
+    assert updated.query_sequence(sequence).keys() == expected.query_sequence(sequence).keys()
+    os.remove("test_update.dbi")
+    # Legacy databases only store folded counts and cannot be updated
+    kmer_db.write_legacy_pyseq_dbi("test_update.legacy")
+    legacy = KmerDb(21, 11)
+    legacy.load_legacy_pyseq_dbi("test_update.legacy")
+    with pytest.raises(kmer_db_module.KmerDbFormatException):
+        legacy.update_database(added = build_subset(reference, bins, [5]))
+    os.remove("test_update.legacy")
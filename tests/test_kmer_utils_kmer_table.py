@@ -0,0 +1,175 @@
+import os
+import random
+import pytest
+from pyseq.kmer_utils import KmerDb
+from pyseq.kmer_utils.kmer_db import KmerDbParameterException
+from pyseq.kmer_utils.kmer_table import KmerTable
+from pyseq.sequence_io import SequenceBlock, SequenceRead
+
+
+def build_test_db():
+    random.seed(0)
+    genome = "".join(random.choice("ACGT") for _ in range(2000))
+    db = KmerDb(21, 11)
+    for i in range(4):
+        sequence = "".join(random.choice("ACGT") if random.random() < 0.05 else b for b in genome)
+        db.add_sequence_to_db(f"bin_{i % 3}", sequence)
+    db.finialize_database(1)
+    reads = SequenceBlock()
+    for i in range(20):
+        start = random.randrange(0, len(genome) - 100)
+        reads.sequences.append(SequenceRead(name = f"read_{i}", sequence = genome[start : start + 100]))
+    return db, reads
+
+
+def test_kmer_table_lookup():
+    db, reads = build_test_db()
+    table = KmerTable.from_dict(db.kmers)
+    assert len(table) == len(db.kmers)
+    assert list(table.minimizers) == sorted(db.kmers.keys())
+    for minimizer, bins in db.kmers.items():
+        assert table.get_bins(minimizer) == list(bins.keys())
+    assert table.get_bins(max(db.kmers.keys()) + 1, ()) == ()
+    for minimizer, bins in table.items():
+        assert bins == [(bin_id, bin_result.unweighted) for bin_id, bin_result in db.kmers[minimizer].items()]
+
+
+def test_compact_kmer_db_bin_reads():
+    db, reads = build_test_db()
+    expected = db.bin_reads(reads)
+    db.compact()
+    assert len(db.kmers) == 0
+    assert db.bin_reads(reads) == expected
+
+
+def test_compact_loaded_pyseq_dbi():
+    db, reads = build_test_db()
+    expected = db.bin_reads(reads)
+    db.write_pyseq_dbi("tmp.pyseq.dbi")
+    binary = KmerDb(21, 11)
+    binary.load_pyseq_dbi("tmp.pyseq.dbi")
+    table = binary.table
+    # Loaded databases are already compact, the table is kept
+    binary.compact()
+    assert binary.table is table
+    assert binary.bin_reads(reads) == expected
+    del binary, table
+    os.remove("tmp.pyseq.dbi")
+
+
+def test_pyseq_dbi_formats():
+    db, reads = build_test_db()
+    expected = db.bin_reads(reads)
+    db.write_pyseq_dbi("tmp.pyseq.dbi")
+    db.write_pyseq_dbi("tmp.legacy.pyseq.dbi", legacy = True)
+
+    binary = KmerDb(21, 11)
+    binary.load_pyseq_dbi("tmp.pyseq.dbi")
+    assert binary.table is not None
+    assert binary.reference_count == db.reference_count
+    assert binary.bin_reads(reads) == expected
+
+    legacy = KmerDb(21, 11)
+    legacy.load_pyseq_dbi("tmp.legacy.pyseq.dbi")
+    assert legacy.table is None
+    assert legacy.bin_reads(reads) == expected
+
+    # Convert binary back to legacy
+    binary.write_pyseq_dbi("tmp.converted.pyseq.dbi", legacy = True)
+    converted = KmerDb(21, 11)
+    converted.load_pyseq_dbi("tmp.converted.pyseq.dbi")
+    assert list(converted.iter_minimizer_bins()) == sorted(legacy.iter_minimizer_bins())
+
+    with pytest.raises(KmerDbParameterException):
+        KmerDb(31, 11).load_pyseq_dbi("tmp.pyseq.dbi")
+    del binary
+    os.remove("tmp.pyseq.dbi")
+    os.remove("tmp.legacy.pyseq.dbi")
+    os.remove("tmp.converted.pyseq.dbi")
+
+
+def test_sharded_pyseq_dbi():
+    db, reads = build_test_db()
+    expected = db.bin_reads(reads)
+    table = KmerTable.from_dict(db.kmers)
+    shards = table.partition(3)
+    assert sum(len(shard) for shard in shards) == len(table)
+    assert sorted(item for shard in shards for item in shard.items()) == list(table.items())
+
+    db.write_pyseq_dbi("tmp.sharded.pyseq.dbi", shards = 3)
+    sharded = KmerDb(21, 11)
+    # Each shard is larger than the memory limit, so only one is loaded at a time
+    sharded.load_pyseq_dbi("tmp.sharded.pyseq.dbi", max_memory = 1)
+    assert len(sharded.shards) == 3
+    assert sharded.bin_reads(reads) == expected
+    assert sharded.query_sequence(reads.sequences[0].sequence).keys() == expected["read_0"]["kmer_counts"].keys()
+    assert len(sharded.shards.loaded) == 1
+    assert sorted(sharded.iter_minimizer_bins()) == list(table.items())
+
+    # Merge shards back into one database
+    sharded.write_pyseq_dbi("tmp.merged.pyseq.dbi")
+    db.write_pyseq_dbi("tmp.pyseq.dbi")
+    with open("tmp.merged.pyseq.dbi", "rb") as merged, open("tmp.pyseq.dbi", "rb") as f:
+        assert merged.read() == f.read()
+    del sharded
+    for path in ["tmp.sharded.pyseq.dbi", "tmp.merged.pyseq.dbi", "tmp.pyseq.dbi"] + \
+            [f"tmp.sharded.pyseq.dbi.{i}.shard" for i in range(3)]:
+        os.remove(path)
+
+
+def test_bloom_filter_pyseq_dbi():
+    pytest.importorskip("numpy")
+    db, reads = build_test_db()
+    expected = db.bin_reads(reads)
+    db.build_bloom_filter(0.01)
+    assert all(minimizer in db.bloom for minimizer in db.kmers.keys())
+    assert db.bin_reads(reads) == expected
+
+    db.write_pyseq_dbi("tmp.bloom.pyseq.dbi")
+    binary = KmerDb(21, 11)
+    binary.load_pyseq_dbi("tmp.bloom.pyseq.dbi")
+    assert binary.bloom.words.tobytes() == db.bloom.words.tobytes()
+    assert binary.bin_reads(reads) == expected
+
+    # Updates rebuild the filter with the new minimizers
+    added = KmerDb(21, 11)
+    added.add_sequence_to_db("bin_3", reads.sequences[0].sequence[::-1])
+    binary.update_database(added = added)
+    assert all(minimizer in binary.bloom for minimizer in added.kmers.keys())
+    del binary
+    os.remove("tmp.bloom.pyseq.dbi")
+
+
+def test_bin_sets(monkeypatch):
+    db, reads = build_test_db()
+    table = KmerTable.from_dict(db.kmers)
+    bin_sets = table.bin_sets()
+    assert len(bin_sets) == len(set(tuple(bins.keys()) for bins in db.kmers.values()))
+    for minimizer, bins in db.kmers.items():
+        assert bin_sets[table.find_set(minimizer)] == tuple(bins.keys())
+    assert table.find_set(max(db.kmers.keys()) + 1) == -1
+
+    # Bin sets are numbered in order of first occurrence with and without numpy
+    from pyseq.kmer_utils import kmer_table
+    if kmer_table.np is not None:
+        np = kmer_table.np
+        minimizers = np.array(sorted(db.kmers.keys()) + [max(db.kmers.keys()) + 1], dtype = np.uint64)
+        assert table.find_sets(minimizers).tolist() == [table.find_set(int(minimizer)) for minimizer in minimizers]
+        monkeypatch.setattr(kmer_table, "np", None)
+        python_table = KmerTable.from_dict(db.kmers)
+        python_table.intern_bin_sets()
+        assert bytes(python_table.set_ids) == bytes(table.set_ids)
+        assert bytes(python_table.set_bin_ids) == bytes(table.set_bin_ids)
+        monkeypatch.undo()
+
+    # Bin sets are stored in binary databases
+    expected = db.bin_reads(reads)
+    db.write_pyseq_dbi("tmp.sets.pyseq.dbi")
+    binary = KmerDb(21, 11)
+    binary.load_pyseq_dbi("tmp.sets.pyseq.dbi")
+    assert binary.table.bin_sets() == bin_sets
+    assert binary.bin_reads(reads) == expected
+    binary.bin_threshold = 3
+    assert binary.bin_reads(reads) != expected
+    del binary
+    os.remove("tmp.sets.pyseq.dbi")
@@ -0,0 +1,74 @@
+import os
+import random
+import pytest
+from pyseq.kmer_utils import (
+    get_minimized_kmers,
+    iter_kmer_minimizers,
+    get_kmer_minimizer,
+    reverse_complement,
+    encode_kmer,
+    decode_kmer)
+
+
+def string_minimized_kmers(sequence, kmer_length, minimizer_length):
+    sequence_rc = reverse_complement(sequence)
+    seq_length  = len(sequence)
+    minimized   = {}
+    for i in range(0, seq_length - kmer_length + 1):
+        kmer      = sequence[i : i + kmer_length]
+        rev_kmer  = sequence_rc[seq_length - kmer_length - i : seq_length - i]
+        minimizer = encode_kmer(get_kmer_minimizer(kmer, rev_kmer, minimizer_length))
+        minimized[minimizer] = minimized.get(minimizer, 0) + 1
+    return minimized
+
+
+def test_encode_kmer():
+    assert encode_kmer("ACGT") == 0b00011011
+    assert encode_kmer("acgt") == encode_kmer("ACGT")
+    assert decode_kmer(encode_kmer("GATTACA"), 7) == "GATTACA"
+    with pytest.raises(ValueError):
+        encode_kmer("ACNT")
+
+
+def test_minimized_kmers_match_string_minimizers():
+    random.seed(0)
+    for kmer_length, minimizer_length in [(31, 19), (25, 17), (15, 15), (8, 3)]:
+        sequence = "".join(random.choice("ACGT") for _ in range(500))
+        expected = string_minimized_kmers(sequence, kmer_length, minimizer_length)
+        observed = get_minimized_kmers(sequence, kmer_length, minimizer_length, 0.2)
+        assert list(observed.items()) == list(expected.items())
+
+
+def test_iter_kmer_minimizers_match_get_kmer_minimizer():
+    random.seed(1)
+    sequences = [
+        "".join(random.choice("ACGT") for _ in range(300)),
+        "A" * 40 + "C" * 40 + "G" * 40 + "T" * 40,
+        "ACGTTGCA" * 30,
+        "".join(random.choice("AC") for _ in range(300)),
+    ]
+    for sequence in sequences:
+        for kmer_length, minimizer_length in [(31, 19), (21, 5), (12, 12), (6, 1)]:
+            sequence_rc = reverse_complement(sequence)
+            seq_length  = len(sequence)
+            expected = []
+            for i in range(0, seq_length - kmer_length + 1):
+                kmer     = sequence[i : i + kmer_length]
+                rev_kmer = sequence_rc[seq_length - kmer_length - i : seq_length - i]
+                expected.append(encode_kmer(get_kmer_minimizer(kmer, rev_kmer, minimizer_length)))
+            observed = []
+            for minimizer, kmer_count in iter_kmer_minimizers(sequence, kmer_length, minimizer_length, 0.2):
+                observed.extend([minimizer] * kmer_count)
+            assert observed == expected
+
+
+def test_minimized_kmers_ambiguous():
+    sequence = "ACGTTGCAAGGCTTAN" + "GATTACAGATTACAGG"
+    # Every kmer contains the N
+    assert get_minimized_kmers(sequence, 20, 5, 0.0) == {}
+    # Minimizers never contain the N
+    minimized = get_minimized_kmers(sequence, 20, 5, 0.2)
+    assert sum(minimized.values()) == len(sequence) - 20 + 1
+    for minimizer in minimized.keys():
+        assert decode_kmer(minimizer, 5) in sequence or \
+            decode_kmer(minimizer, 5) in reverse_complement(sequence)
@@ -0,0 +1,19 @@
+import pytest
+from pyseq.kmer_utils import ReadMemo
+
+
+def test_read_memo():
+    memo = ReadMemo(2)
+    assert ReadMemo.key("ACGT") == ReadMemo.key(b"ACGT") == ReadMemo.key(memoryview(b"ACGT"))
+    assert ReadMemo.key("ACGT") != ReadMemo.key("ACGA")
+    keys = [ReadMemo.key(sequence) for sequence in ["AAAA", "CCCC", "GGGG"]]
+    assert memo.get(keys[0]) is None
+    memo.put(keys[0], {"assigned_bin" : "bin_1"})
+    memo.put(keys[1], {"assigned_bin" : "bin_2"})
+    assert memo.get(keys[0]) == {"assigned_bin" : "bin_1"}
+    # The least recently used key is forgotten
+    memo.put(keys[2], {"assigned_bin" : None})
+    assert len(memo) == 2 and keys[1] not in memo and keys[0] in memo
+    assert memo.get(keys[1]) is None
+    assert (memo.hits, memo.lookups) == (1, 3)
+    assert memo.hit_rate() == pytest.approx(1 / 3)
@@ -0,0 +1,59 @@
+import os
+import pickle
+import pytest
+from pyseq.sequence_io import SequenceFile, SequenceRead, ColumnarBlock
+
+
+def test_columnar_block():
+    reads = [
+        SequenceRead(name = "read_1", sequence = "ACGTACGT", quality_scores = "ABCDEFGH"),
+        SequenceRead(name = "read_2", sequence = "GGCC"),
+        SequenceRead(name = "read_3", sequence = "TTTTTT", quality_scores = "######"),
+    ]
+    block = ColumnarBlock.from_reads(reads)
+    assert len(block) == 3
+    assert block.get_names() == ["read_1", "read_2", "read_3"]
+    assert block.get_sequences() == ["ACGTACGT", "GGCC", "TTTTTT"]
+    assert block.get_lengths() == [8, 4, 6]
+    assert isinstance(block.get_sequence(0), memoryview)
+    assert bytes(block.get_quality(1)) == b"IIII"
+    assert bytes(block.get_bases(1, 3)) == b"GGCCTTTTTT"
+    assert str(block.get_read(0)) == str(reads[0])
+
+    sub_block = block.slice(1, 3)
+    assert sub_block.get_names() == ["read_2", "read_3"]
+    assert bytes(sub_block.get_quality(1)) == b"######"
+    assert pickle.loads(pickle.dumps(sub_block)).get_sequences() == ["GGCC", "TTTTTT"]
+
+    selected = block.select([2, 0])
+    assert selected.get_names() == ["read_3", "read_1"]
+    assert selected.get_sequences() == ["TTTTTT", "ACGTACGT"]
+    assert bytes(selected.get_quality(1)) == b"ABCDEFGH"
+    assert len(block.select([])) == 0
+
+
+def test_write_fastq():
+    block = ColumnarBlock()
+    block.add_read("read_1", "ACGT", "ABCD")
+    block.add_read("read_2", "GGC")
+    with open("tmp.fastq", "wb") as f:
+        block.write_fastq(f)
+        block.write_fastq(f, [1])
+    with open("tmp.fastq", "r") as f:
+        assert f.read() == "@read_1\nACGT\n+\nABCD\n@read_2\nGGC\n+\nIII\n@read_2\nGGC\n+\nIII\n"
+    with open("tmp.fastq", "wb") as f:
+        block.write_fasta(f, [1, 0])
+    with open("tmp.fastq", "r") as f:
+        assert f.read() == ">read_2\nGGC\n>read_1\nACGT\n"
+    os.remove("tmp.fastq")
+
+
+def test_iter_columnar_blocks():
+    with open("tmp.fastq", "w") as f:
+        for i in range(25):
+            f.write(f"@read_{i}\nACGTACGTAC\n+\nIIIIIIIIII\n")
+
+    blocks = list(SequenceFile().iter_blocks("tmp.fastq", reads_per_block = 10, columnar = True))
+    assert [len(block) for block in blocks] == [10, 10, 5]
+    assert [name for block in blocks for name in block.get_names()] == [f"read_{i}" for i in range(25)]
+    os.remove("tmp.fastq")
@@ -0,0 +1,57 @@
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import struct
+import pytest
+from pyseq.sequence_io import SequenceFile
+from pyseq.sequence_io.decompression import DecompressedFile, find_decompression_command
+
+
+FASTQ = "".join(f"@read_{i}\nACGTACGTAC\n+\nIIIIIIIIII\n" for i in range(1000)).encode()
+
+
+def write_bgzf(path, data, block_size = 5000):
+    # Gzip members with a BC extra field holding the block size, then an empty EOF block
+    with open(path, "wb") as f:
+        blocks = [data[start : start + block_size] for start in range(0, len(data), block_size)]
+        for block in blocks + [b""]:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            deflated = compressor.compress(block) + compressor.flush()
+            header = b"\x1f\x8b\x08\x04" + b"\x00" * 4 + b"\x00\xff" + struct.pack("<H", 6)
+            header += b"BC" + struct.pack("<HH", 2, len(deflated) + 25)
+            f.write(header + deflated + struct.pack("<II", zlib.crc32(block), len(block)))
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_decompressed_file(background):
+    paths = {"tmp.fq": FASTQ, "tmp.fq.gz": gzip.compress(FASTQ), "tmp.fq.bz2": bz2.compress(FASTQ),
+        "tmp.fq.xz": lzma.compress(FASTQ)}
+    for path, data in paths.items():
+        with open(path, "wb") as f:
+            f.write(data)
+    write_bgzf("tmp.fq.bgz", FASTQ)
+    paths["tmp.fq.bgz"] = None
+
+    for path in paths:
+        with DecompressedFile(path, background = background) as f:
+            assert f.read(7) + f.read() == FASTQ
+        reads = list(SequenceFile(background = background).iter_reads(path, buffer_size = 1000))
+        assert [read.name for read in reads] == [f"read_{i}" for i in range(1000)]
+    with DecompressedFile("tmp.fq.bgz", use_subprocess = True, background = background) as f:
+        assert f.read() == FASTQ
+    for path in paths:
+        os.remove(path)
+
+
+@pytest.mark.skipif(find_decompression_command("zstd") is None, reason = "zstd command not installed")
+def test_zstd_subprocess():
+    with open("tmp.fq", "wb") as f:
+        f.write(FASTQ)
+    os.system("zstd -q -f tmp.fq -o tmp.fq.zst")
+    with DecompressedFile("tmp.fq.zst", use_subprocess = True) as f:
+        assert f.compression == "zstd"
+        assert f.read() == FASTQ
+    os.remove("tmp.fq")
+    os.remove("tmp.fq.zst")
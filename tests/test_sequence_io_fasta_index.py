@@ -0,0 +1,52 @@
+import os
+import random
+import pytest
+from pyseq.sequence_io import SequenceFile, FastaIndex
+from pyseq.sequence_io.fasta_index import FastaIndexException
+
+
+def write_fasta(path, sequences, line_width, line_ending = "\n"):
+    with open(path, "w", newline = "") as f:
+        for name, sequence in sequences.items():
+            f.write(f">{name} description{line_ending}")
+            for start in range(0, len(sequence), line_width):
+                f.write(f"{sequence[start : start + line_width]}{line_ending}")
+
+
+def test_fasta_index():
+    random.seed(0)
+    sequences = {f"seq_{i}": "".join(random.choice("ACGT") for _ in range(random.randint(1, 300))) for i in range(5)}
+    for line_ending in ["\n", "\r\n"]:
+        write_fasta("tmp.fasta", sequences, 60, line_ending)
+        with FastaIndex("tmp.fasta") as index:
+            assert len(index) == 5
+            for name, sequence in sequences.items():
+                assert index.fetch(name) == sequence
+                for _ in range(20):
+                    start = random.randrange(len(sequence))
+                    end   = random.randint(start + 1, len(sequence))
+                    assert index.fetch(f"{name}:{start + 1}-{end}") == sequence[start:end]
+                assert index.fetch(f"{name}:2") == sequence[1:]
+        # samtools-compatible index is read back
+        with open("tmp.fasta.fai") as f:
+            first = f.readline().split("\t")
+        assert first[:2] == ["seq_0", str(len(sequences["seq_0"]))]
+        assert first[3:] == ["60", f"{60 + len(line_ending)}\n"]
+        with FastaIndex("tmp.fasta") as index:
+            assert index.fetch("seq_4") == sequences["seq_4"]
+        os.remove("tmp.fasta.fai")
+
+    sf = SequenceFile()
+    sf.load_sequences_from_index("tmp.fasta", ["seq_3", "seq_1 description", "missing"])
+    assert [read.name for read in sf.sequence_blocks[0].sequences] == ["seq_3", "seq_1 description"]
+    assert sf.sequence_blocks[0].sequences[1].sequence == sequences["seq_1"]
+    os.remove("tmp.fasta")
+    os.remove("tmp.fasta.fai")
+
+
+def test_fasta_index_line_lengths():
+    with open("tmp.fasta", "w") as f:
+        f.write(">seq_1\nACGT\nACG\nACGT\n")
+    with pytest.raises(FastaIndexException):
+        FastaIndex("tmp.fasta")
+    os.remove("tmp.fasta")
@@ -0,0 +1,43 @@
+import os
+import pytest
+from pyseq.sequence_io import SequenceBlock, SequenceRead
+
+
+def test_fasta_from_str():
+    data = ">ref_1 description\nACGTACGT\nACGT\n>ref_2\n>ref_3\nGGXG\n\n>ref_4\nTT"
+    block = SequenceBlock()
+    block.add_sequence_block_from_str(data)
+    assert [read.name for read in block.sequences] == ["ref_1 description", "ref_3", "ref_4"]
+    assert [read.sequence for read in block.sequences] == ["ACGTACGTACGT", "GGNG", "TT"]
+    assert block.sequences[0].quality_scores == "I" * 12
+    assert block.select([2, 0]).get_names() == ["ref_4", "ref_1 description"]
+
+
+def test_fastq_from_str():
+    data = (
+        "@read_1\nACGT\n+\nIIII\n"
+        "@read_2\nACGTA\n+\nIII\n"
+        "@read_3\nGGCC\n+read_3\n@@II\n"
+        "\n"
+        "@read_4\nTTTT\n+\nABCD")
+    block = SequenceBlock()
+    block.add_sequence_block_from_str(data)
+    assert [read.name for read in block.sequences] == ["read_1", "read_3", "read_4"]
+    assert [read.sequence for read in block.sequences] == ["ACGT", "GGCC", "TTTT"]
+    assert block.sequences[1].comment == "+read_3"
+    assert block.sequences[1].quality_scores == "@@II"
+    assert block.invalid_reads == 1
+
+
+def test_sequence_read():
+    read = SequenceRead(name = "@read_1", sequence = "ACGTRYacgtn\n")
+    assert read.sequence == "ACGTNNacgtn"
+    assert read.quality_scores == "I" * 11
+    assert str(read) == "@read_1\nACGTNNacgtn\n+\nIIIIIIIIIII"
+    assert not hasattr(read, "__dict__")
+
+    read = SequenceRead(sequence = "ACGT", quality_scores = "ABCD")
+    assert read.quality_scores == "ABCD"
+    read = SequenceRead(sequence = "ACGT", quality_scores = "ABC")
+    assert read.quality_scores == "IIII"
+    assert SequenceRead.check_sequence("AC-GTé") == "ACNGTN"
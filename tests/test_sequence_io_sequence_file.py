@@ -0,0 +1,109 @@
+import os
+import gzip
+import random
+import pytest
+from pyseq.sequence_io import SequenceFile
+
+
+FASTQ = """@read_1 comment
+ACGTACGTAC
++
+IIIIIIIIII
+@read_2
+GGGGCCCCAAAATTTT
++
+ABCDEFGHIJKLMNOP
+"""
+
+FASTA = """>ref_1
+ACGTACGT
+ACGT
+>ref_2
+GGGG
+"""
+
+
+def test_iter_reads():
+    with open("tmp.fastq", "w") as f:
+        f.write(FASTQ)
+    with gzip.open("tmp.fasta.gz", "wt") as f:
+        f.write(FASTA)
+
+    reads = list(SequenceFile().iter_reads("tmp.fastq"))
+    assert [read.name for read in reads] == ["read_1 comment", "read_2"]
+    assert reads[1].sequence == "GGGGCCCCAAAATTTT"
+    assert reads[1].quality_scores == "ABCDEFGHIJKLMNOP"
+
+    reads = list(SequenceFile().iter_reads("tmp.fasta.gz"))
+    assert [read.name for read in reads] == ["ref_1", "ref_2"]
+    assert reads[0].sequence == "ACGTACGTACGT"
+    assert reads[0].quality_scores == "I" * 12
+
+    sf = SequenceFile()
+    sf.load_sequence_blocks_from_file("tmp.fastq")
+    assert [read.name for read in sf.sequence_blocks[0].sequences] == ["read_1 comment", "read_2"]
+    os.remove("tmp.fastq")
+    os.remove("tmp.fasta.gz")
+
+
+def test_iter_blocks():
+    with gzip.open("tmp.fastq.gz", "wt") as f:
+        for i in range(25):
+            f.write(f"@read_{i}\nACGTACGTAC\n+\nIIIIIIIIII\n")
+
+    sf = SequenceFile()
+    blocks = list(sf.iter_blocks("tmp.fastq.gz", reads_per_block = 10))
+    assert [len(block.sequences) for block in blocks] == [10, 10, 5]
+    assert [read.name for block in blocks for read in block.sequences] == [f"read_{i}" for i in range(25)]
+    assert len(sf.sequence_blocks) == 0
+    assert len(list(sf.iter_blocks("tmp.fastq.gz", reads_per_block = 25))) == 1
+    os.remove("tmp.fastq.gz")
+
+
+def test_iter_reads_small_buffers():
+    with open("tmp.fastq", "w") as f:
+        f.write("header line\n" + FASTQ + "@truncated\nACGT\n")
+    with open("tmp.fasta", "w") as f:
+        f.write(FASTA.replace("\n", "\r\n"))
+
+    for buffer_size in [1, 3, 7, 1 << 22]:
+        reads = list(SequenceFile().iter_reads("tmp.fastq", buffer_size))
+        assert [read.name for read in reads] == ["read_1 comment", "read_2"]
+        assert [read.quality_scores for read in reads] == ["IIIIIIIIII", "ABCDEFGHIJKLMNOP"]
+
+        reads = list(SequenceFile().iter_reads("tmp.fasta", buffer_size))
+        assert [read.name for read in reads] == ["ref_1", "ref_2"]
+        assert [read.sequence for read in reads] == ["ACGTACGTACGT", "GGGG"]
+    os.remove("tmp.fastq")
+    os.remove("tmp.fasta")
+
+
+def test_iter_reads_fasta_whitespace():
+    with open("tmp.fasta", "w") as f:
+        f.write(">ref_1 @host \nACGT \nAC\t\n>ref_2\r\nGGGG\r\r\n")
+
+    for buffer_size in [1, 1 << 22]:
+        reads = list(SequenceFile().iter_reads("tmp.fasta", buffer_size))
+        assert [read.name for read in reads] == ["ref_1 @host", "ref_2"]
+        assert [read.sequence for read in reads] == ["ACGTAC", "GGGG"]
+    os.remove("tmp.fasta")
+
+
+def test_iter_blocks_parallel():
+    random.seed(0)
+    with open("tmp.fastq", "w") as f:
+        for i in range(200):
+            length = random.randint(20, 80)
+            sequence = "".join(random.choice("ACGT") for _ in range(length))
+            # Quality lines starting with "@" must not be taken for headers
+            quality = "@" + "".join(random.choice("@+I#") for _ in range(length - 1))
+            f.write(f"@read_{i}\n{sequence}\n+\n{quality}\n")
+
+    expected = [str(read) for block in SequenceFile().iter_blocks("tmp.fastq") for read in block.sequences]
+    blocks = list(SequenceFile().iter_blocks("tmp.fastq", reads_per_block = 30, threads = 2))
+    assert len(blocks) > 1
+    assert [str(read) for block in blocks for read in block.sequences] == expected
+    blocks = SequenceFile().iter_blocks("tmp.fastq", reads_per_block = 30, columnar = True, threads = 2)
+    assert [str(block.get_read(i)) for block in blocks for i in range(len(block))] == expected
+    os.remove("tmp.fastq")
+
@@ -0,0 +1,56 @@
+import os
+import gzip
+import shutil
+import pytest
+from pyseq.sequence_io import SequenceFile, ColumnarBlock, SplitFileWriter
+from pyseq.sequence_io.split_writer import SplitWriterException
+
+
+def make_block(n_reads):
+    block = ColumnarBlock()
+    for i in range(n_reads):
+        block.add_read(f"read_{i}", "ACGT" * (i % 5 + 1), "I" * 4 * (i % 5 + 1))
+    return block
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_split_file_writer(compress):
+    block = make_block(50)
+    # Small buffers and two open files force files to be closed and reopened
+    with SplitFileWriter("tmp_split", "fastq", compress, max_open_files = 2, buffer_size = 100) as writer:
+        for i in range(len(block)):
+            writer.write(f"bin/{i % 4}", block, [i])
+    assert writer.n_opens > 4
+    assert sorted(os.listdir("tmp_split")) == [f"bin_{i}.fastq" + (".gz" if compress else "") for i in range(4)]
+    for j in range(4):
+        path = writer.paths[f"bin/{j}"]
+        names = [read.name for b in SequenceFile().iter_blocks(path, 100) for read in b.sequences]
+        assert names == [f"read_{i}" for i in range(j, 50, 4)]
+    shutil.rmtree("tmp_split")
+
+
+def test_split_file_writer_names():
+    block = make_block(8)
+    keys = ["bin/1", "bin_1", "unclassified", None]
+    with SplitFileWriter("tmp_split", "fasta", max_open_files = 1, buffer_size = 10) as writer:
+        for i in range(len(block)):
+            writer.write(keys[i % 4], block, [i])
+    # Keys sanitized to the same name and the reserved unclassified name get their own files
+    assert [os.path.basename(writer.paths[key]) for key in keys] == \
+        ["bin_1.fasta", "bin_1_2.fasta", "unclassified_2.fasta", "unclassified.fasta"]
+    for j, key in enumerate(keys):
+        names = [read.name for b in SequenceFile().iter_blocks(writer.paths[key], 100) for read in b.sequences]
+        assert names == [f"read_{j}", f"read_{j + 4}"]
+    shutil.rmtree("tmp_split")
+
+
+def test_split_file_writer_fasta():
+    block = make_block(3)
+    with SplitFileWriter("tmp_split", "fasta") as writer:
+        writer.write("bin_1", block, [0, 2])
+        writer.write("bin_1", block)
+    with open("tmp_split/bin_1.fasta", "r") as f:
+        assert f.read() == ">read_0\nACGT\n>read_2\nACGTACGTACGT\n>read_0\nACGT\n>read_1\nACGTACGT\n>read_2\nACGTACGTACGT\n"
+    shutil.rmtree("tmp_split")
+    with pytest.raises(SplitWriterException):
+        SplitFileWriter("tmp_split", "sam")